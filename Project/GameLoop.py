@@ -0,0 +1,168 @@
+try:
+    from time import monotonic as clock
+except ImportError:
+    from time import time as clock
+from time import sleep
+
+
+class FrameTimeHistogram:
+    # Counts durations (in seconds) per series in buckets of milliseconds,
+    # the last bucket takes everything above the largest bound
+
+    BOUNDS = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.series = dict()
+        self.missed = 0
+        self.dropped = 0
+
+
+    # Adds one duration to the given series ("update", "render", "frame")
+    def record(self, name, duration):
+        entry = self.series.get(name)
+        if entry is None:
+            entry = {"counts": [0] * (len(self.BOUNDS) + 1), "total": 0.0, "max": 0.0}
+            self.series[name] = entry
+
+        ms = duration * 1000
+        bucket = 0
+        while bucket < len(self.BOUNDS) and ms > self.BOUNDS[bucket]:
+            bucket += 1
+        entry["counts"][bucket] += 1
+        entry["total"] += duration
+        if duration > entry["max"]:
+            entry["max"] = duration
+
+
+    # Returns the number of durations recorded in the given series
+    def getCount(self, name):
+        entry = self.series.get(name)
+        if entry is None:
+            return 0
+        return sum(entry["counts"])
+
+
+    # Returns all numbers as dict, e.g. for json.dump()
+    def toDict(self):
+        return {"bounds_ms": list(self.BOUNDS), "deadline": self.deadline,
+                "missed": self.missed, "dropped": self.dropped, "series": self.series}
+
+
+    # Writes the histogram as CSV file, one line per series
+    def save(self, filename):
+        with open(filename, "w") as file:
+            header = ["series"] + ["<=%dms" % bound for bound in self.BOUNDS]
+            header += [">%dms" % self.BOUNDS[-1], "count", "mean_ms", "max_ms"]
+            file.write(",".join(header) + "\n")
+            for name, entry in sorted(self.series.items()):
+                count = sum(entry["counts"])
+                row = [name] + [str(n) for n in entry["counts"]]
+                row += [str(count), "%.3f" % (entry["total"] * 1000 / max(count, 1)),
+                        "%.3f" % (entry["max"] * 1000)]
+                file.write(",".join(row) + "\n")
+
+
+    def __str__(self):
+        lines = ["Frame times (deadline %.1f ms, missed %d, dropped updates %d)"
+                 % (self.deadline * 1000, self.missed, self.dropped)]
+        for name, entry in sorted(self.series.items()):
+            count = sum(entry["counts"])
+            lines.append("%s: %d, mean %.3f ms, max %.3f ms"
+                         % (name, count, entry["total"] * 1000 / max(count, 1), entry["max"] * 1000))
+            lower = 0
+            for bound, n in zip(self.BOUNDS + (None,), entry["counts"]):
+                if n > 0:
+                    if bound is None:
+                        label = "> %d ms" % lower
+                    else:
+                        label = "%d - %d ms" % (lower, bound)
+                    lines.append("  %-14s %6d %s" % (label, n, "#" * (50 * n // count)))
+                lower = bound
+        return "\n".join(lines)
+
+
+    # Prints the histogram
+    def printout(self):
+        print(self)
+
+
+class GameLoop:
+    # Calls update() in fixed time steps of dt seconds and render(alpha) once
+    # per advance(), alpha in [0, 1) is the fraction of the next step already
+    # passed (for interpolation). At most maxUpdates steps are made per
+    # advance(), the remaining time is dropped, so a slow update cannot pile up.
+
+    def __init__(self, update, render = None, dt = 0.25, maxUpdates = 5):
+        self.update = update
+        self.render = render
+        self.dt = dt
+        self.maxUpdates = maxUpdates
+        self.histogram = FrameTimeHistogram(dt)
+        self.timer = None
+        self.running = False
+        self.lastTime = None
+        self.accumulator = 0.0
+
+
+    # Does the updates that are due and renders once
+    def advance(self):
+        now = clock()
+        if self.lastTime is None:
+            self.lastTime = now
+        self.accumulator += now - self.lastTime
+        self.lastTime = now
+
+        updates = 0
+        while self.accumulator >= self.dt and self.running:
+            if updates == self.maxUpdates:
+                self.histogram.dropped += int(self.accumulator / self.dt)
+                self.accumulator %= self.dt
+                break
+            start = clock()
+            self.update()
+            self.histogram.record("update", clock() - start)
+            self.accumulator -= self.dt
+            updates += 1
+
+        if self.render is not None and self.running:
+            start = clock()
+            self.render(self.accumulator / self.dt)
+            self.histogram.record("render", clock() - start)
+
+        duration = clock() - now
+        self.histogram.record("frame", duration)
+        if duration > self.dt:
+            self.histogram.missed += 1
+
+
+    # Starts the loop driven by a QTimer in the GUI thread, the timer fires
+    # every interval milliseconds (default: 60 times a second, at most every step).
+    # The Qt event loop must run, e.g. with keep()
+    def start(self, interval = None):
+        from PyQt4.QtCore import QTimer
+        if interval is None:
+            interval = min(16, int(self.dt * 1000))
+        self.running = True
+        self.lastTime = None
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.advance)
+        self.timer.start(interval)
+
+
+    # Runs the loop without Qt until stop() is called, sleeps until the next step is due
+    def run(self):
+        self.running = True
+        self.lastTime = None
+        while self.running:
+            self.advance()
+            if self.running:
+                sleep(max(0.0, self.dt - self.accumulator))
+
+
+    # Stops the loop
+    def stop(self):
+        self.running = False
+        if self.timer is not None:
+            self.timer.stop()
+            self.timer = None
@@ -1,48 +1,235 @@
-from enum import *
+from collections import deque
+from array import array
+from random import Random
 
-class GameState:
-    size = 3
-    x = 2
-    y = 0
-    grid = list()
-    snake = list()
+# States of a tile, see GameState.getCell()
+EMPTY = 0
+SNAKE = 1
+APPLE = 2
 
-    lastSegment = (0, 0)
+# Movement of the snake head for each direction of tiger.getDir()
+DIRECTIONS = {"right": (1, 0), "left": (-1, 0), "up": (0, 1), "down": (0, -1)}
 
+# Directions numbered for compact storage, the reverse of direction n is (n + 2) % 4
+ACTIONS = ("right", "up", "left", "down")
 
-    applex = 0
-    appley = 0
-    appleBool = False
 
-    class gridStates(Enum):
-        snake = "Snake"
-        apple = "Apple"
+class Snake(object):
+    # Snake body as deque of (x, y) tiles with the head at the left end,
+    # the occupied tiles are bits of a bytearray (bit y * GRIDSIZE + x),
+    # so all operations are O(1) and a 1000x1000 grid needs 125 KB
+
+    __slots__ = ("body", "GRIDSIZE", "occupied")
+
+    def __init__(self, tiles, GRIDSIZE):
+        self.body = deque(tiles)
+        self.GRIDSIZE = GRIDSIZE
+        self.occupied = bytearray((GRIDSIZE * GRIDSIZE + 7) // 8)
+        for tile in self.body:
+            index = tile[1] * GRIDSIZE + tile[0]
+            self.occupied[index >> 3] |= 1 << (index & 7)
+
+
+    # Returns the tile of the head
+    def getHead(self):
+        return self.body[0]
+
+
+    # Returns the tile of the last segment
+    def getTail(self):
+        return self.body[-1]
+
+
+    # Adds a new head in front of the snake
+    def pushHead(self, tile):
+        self.body.appendleft(tile)
+        index = tile[1] * self.GRIDSIZE + tile[0]
+        self.occupied[index >> 3] |= 1 << (index & 7)
+
+
+    # Removes the last segment and returns its tile
+    def popTail(self):
+        tile = self.body.pop()
+        index = tile[1] * self.GRIDSIZE + tile[0]
+        self.occupied[index >> 3] &= ~(1 << (index & 7))
+        return tile
+
+
+    # Checks if the given tile (inside of the grid) is occupied by the snake
+    def collides(self, tile):
+        index = tile[1] * self.GRIDSIZE + tile[0]
+        return (self.occupied[index >> 3] >> (index & 7)) & 1 == 1
+
+
+    def __len__(self):
+        return len(self.body)
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def __getitem__(self, index):
+        return self.body[index]
+
+    def __repr__(self):
+        return repr(list(self.body))
+
+
+class FreeTiles(object):
+    # Pool of the tiles not occupied by the snake, stored as tile indices
+    # y * GRIDSIZE + x in the first count entries of the flat array tiles.
+    # A tile is removed by moving the last entry into its place, the array
+    # positions finds that place (-1: not in the pool), so add/remove/pick are O(1).
+    # The two arrays take 8 bytes per tile, whatever the moves (8 MB for 1000x1000).
+
+    __slots__ = ("GRIDSIZE", "count", "tiles", "positions")
 
     def __init__(self, GRIDSIZE):
-        # Create empty List
-        for i in range(GRIDSIZE):
-            row = list()
-            for y in range(GRIDSIZE):
-                row.append(None)
-            self.grid.append(row)
+        self.GRIDSIZE = GRIDSIZE
+        self.count = GRIDSIZE * GRIDSIZE
+        self.tiles = array("i", range(self.count))
+        self.positions = array("i", range(self.count))
+
+
+    # Returns the tile index at the given position of the pool
+    def tileAt(self, position):
+        return self.tiles[position]
+
+
+    # Returns the position of the tile index in the pool, -1 if not in the pool
+    def positionOf(self, index):
+        return self.positions[index]
+
+
+    # Removes the (x, y) tile from the pool
+    def remove(self, tile):
+        index = tile[1] * self.GRIDSIZE + tile[0]
+        position = self.positions[index]
+        self.count -= 1
+        last = self.tiles[self.count]
+        self.tiles[position] = last
+        self.positions[last] = position
+        self.positions[index] = -1
+
+
+    # Puts the (x, y) tile back into the pool
+    def add(self, tile):
+        index = tile[1] * self.GRIDSIZE + tile[0]
+        self.tiles[self.count] = index
+        self.positions[index] = self.count
+        self.count += 1
+
+
+    # Returns the (x, y) tile at the given position of the pool
+    def get(self, position):
+        return divmod(self.tileAt(position), self.GRIDSIZE)[::-1]
 
 
-        # Create Snake List
-        self.snake.append((2, 0))
-        self.snake.append((1, 0))
-        self.snake.append((0, 0))
+    # Returns a random free (x, y) tile, picked with the given random.Random
+    def random(self, rng):
+        return self.get(rng.randrange(self.count))
 
-        # Add Snake to Grid List
-        self.grid[0][2] = self.gridStates.snake
-        self.grid[0][1] = self.gridStates.snake
-        self.grid[0][0] = self.gridStates.snake
 
+    def __contains__(self, tile):
+        return self.positionOf(tile[1] * self.GRIDSIZE + tile[0]) >= 0
 
-    # Returns the Snake List
+    def __len__(self):
+        return self.count
+
+
+class GameState(object):
+    # All state is per instance, __slots__ keeps the instances small
+
+    __slots__ = ("GRIDSIZE", "random", "recordDelta", "size", "x", "y", "lastSegment",
+                 "applex", "appley", "appleBool", "snake", "freeTiles", "delta")
+
+    # seed: seed of the random generator for the apples (None: random seed)
+    # recordDelta: False if nobody takes the deltas (no GUI)
+    def __init__(self, GRIDSIZE, seed = None, recordDelta = True):
+        self.GRIDSIZE = GRIDSIZE
+        self.random = Random(seed)
+        self.recordDelta = recordDelta
+        self.size = 3
+        self.x = 2
+        self.y = 0
+        self.lastSegment = (0, 0)
+        self.applex = 0
+        self.appley = 0
+
+        # Create Snake, head first
+        self.setSnake([(2, 0), (1, 0), (0, 0)])
+
+
+    # Returns the Snake
     def getSnake(self):
         return self.snake
 
 
+    # Returns the tile the head of the snake moves to in the given direction
+    def nextHead(self, direction):
+        x, y = self.snake.getHead()
+        dx, dy = DIRECTIONS[direction]
+        return (x + dx, y + dy)
+
+
+    # Moves the head of the snake to the given tile, the snake grows by keeping
+    # its last segment. Returns False if the snake bites itself, then nothing is changed.
+    # The last segment moves away in the same tick, so the head may move onto it
+    def moveSnake(self, head, grow):
+        if self.snake.collides(head) and (grow or head != self.snake.getTail()):
+            return False
+
+        if not grow:
+            self.lastSegment = self.snake.popTail()
+            self.freeTiles.add(self.lastSegment)
+            self.setCell(self.lastSegment, EMPTY)
+
+        self.snake.pushHead(head)
+        self.freeTiles.remove(head)
+        self.setCell(head, SNAKE)
+        return True
+
+
+    # Places the apple on the given (x, y) tile
+    def placeApple(self, tile):
+        self.applex = tile[0]
+        self.appley = tile[1]
+        self.appleBool = True
+        self.setCell(tile, APPLE)
+
+
+    # Returns the state of the (x, y) tile
+    def getCell(self, tile):
+        if self.snake.collides(tile):
+            return SNAKE
+        if self.appleBool and tile[0] == self.applex and tile[1] == self.appley:
+            return APPLE
+        return EMPTY
+
+
+    # Records the new state of the (x, y) tile in the delta, the state itself
+    # is kept by the snake and the apple
+    def setCell(self, tile, state):
+        if self.recordDelta:
+            self.delta.append((tile[0], tile[1], state))
+
+
+    # Returns the (x, y, state) changes since the last call and starts a new delta
+    def takeDelta(self):
+        delta = self.delta
+        self.delta = list()
+        return delta
+
+
+    # Returns a random (x, y) tile which is not occupied by the snake
+    def randomFreeTile(self):
+        return self.freeTiles.random(self.random)
+
+
+    # Checks if the tile is inside of the grid
+    def isInside(self, tile):
+        return 0 <= tile[0] < self.GRIDSIZE and 0 <= tile[1] < self.GRIDSIZE
+
+
     # Set X cords of the Head of the Snake
     def setX(self, x):
         self.x = x
@@ -58,16 +245,28 @@ class GameState:
         self.size = self.size + 1
 
 
-    # Returns the hole Grid List
+    # Returns the hole Grid as new flat bytearray of tile states, index y * GRIDSIZE + x
     def getGrid(self):
-        return self.grid
-
+        grid = bytearray(self.GRIDSIZE * self.GRIDSIZE)
+        for x, y in self.snake:
+            grid[y * self.GRIDSIZE + x] = SNAKE
+        if self.appleBool:
+            grid[self.appley * self.GRIDSIZE + self.applex] = APPLE
+        return grid
 
-    # Sets a new Grid List
-    def setGrid(self, grid):
-        self.grid = grid
 
-
-    # Sets a new Snake List
+    # Sets a new Snake (or a list of tiles, head first)
     def setSnake(self, newSnake):
+        if not isinstance(newSnake, Snake):
+            newSnake = Snake(newSnake, self.GRIDSIZE)
         self.snake = newSnake
+        self.appleBool = False
+
+        # Tiles the apple can be placed on
+        self.freeTiles = FreeTiles(self.GRIDSIZE)
+
+        # The snake goes into the first delta
+        self.delta = list()
+        for tile in self.snake:
+            self.freeTiles.remove(tile)
+            self.setCell(tile, SNAKE)
@@ -0,0 +1,212 @@
+from Simulation import *
+from array import array
+from bisect import bisect_right
+
+# Replay file layout (all numbers are varints, 7 bits per byte, low bits first):
+#   "SNKR", version, GRIDSIZE, snapshot interval, ticks
+#   number of direction bytes, directions with 2 bits per tick (index into ACTIONS)
+#   number of spawns, tile index y * GRIDSIZE + x of each spawned apple
+#   number of snapshots, per snapshot: tick, number of spawns so far, direction,
+#   size, apple tile + 1 (0: no apple), snake length, snake tiles head first
+MAGIC = b"SNKR"
+VERSION = 1
+
+
+# Appends the number as varint to the bytearray
+def writeVarint(buffer, value):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+# Reads a varint at the given position, returns the number and the next position
+def readVarint(data, position):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+class Recorder:
+    # Plays a Simulation and records the directions and the spawned apples of
+    # every tick. Use step() instead of simulation.step(). Every snapshotInterval
+    # ticks the state is stored, so the replay can seek without playing from tick 0.
+
+    def __init__(self, simulation, snapshotInterval = 1000):
+        if simulation.ticks != 0:
+            raise Exception("Recording must start with a new game.")
+        self.simulation = simulation
+        self.snapshotInterval = snapshotInterval
+        self.directions = bytearray()
+        self.spawns = bytearray()
+        self.spawnCount = 0
+        self.snapshots = bytearray()
+        self.snapshotCount = 0
+
+
+    # Moves the snake like Simulation.step() and records the tick
+    def step(self, direction = None):
+        simulation = self.simulation
+        tick = simulation.ticks
+        if tick % self.snapshotInterval == 0 and simulation.alive:
+            self.snapshot()
+
+        events = simulation.step(direction)
+
+        action = ACTIONS.index(simulation.direction)
+        if tick % 4 == 0:
+            self.directions.append(action)
+        else:
+            self.directions[-1] |= action << (2 * (tick % 4))
+
+        for event in events:
+            if event[0] == "spawn":
+                writeVarint(self.spawns, event[1][1] * simulation.GRIDSIZE + event[1][0])
+                self.spawnCount += 1
+        return events
+
+
+    # Stores the current state of the game
+    def snapshot(self):
+        simulation = self.simulation
+        state = simulation.state
+        G = simulation.GRIDSIZE
+        buffer = self.snapshots
+        writeVarint(buffer, simulation.ticks)
+        writeVarint(buffer, self.spawnCount)
+        writeVarint(buffer, ACTIONS.index(simulation.direction))
+        writeVarint(buffer, state.size)
+        if state.appleBool:
+            writeVarint(buffer, state.appley * G + state.applex + 1)
+        else:
+            writeVarint(buffer, 0)
+        writeVarint(buffer, len(state.snake))
+        for x, y in state.snake:
+            writeVarint(buffer, y * G + x)
+        self.snapshotCount += 1
+
+
+    # Returns the recording as bytes
+    def getBytes(self):
+        data = bytearray(MAGIC)
+        for value in (VERSION, self.simulation.GRIDSIZE, self.snapshotInterval, self.simulation.ticks):
+            writeVarint(data, value)
+        writeVarint(data, len(self.directions))
+        data += self.directions
+        writeVarint(data, self.spawnCount)
+        data += self.spawns
+        writeVarint(data, self.snapshotCount)
+        data += self.snapshots
+        return bytes(data)
+
+
+    # Writes the recording to a file
+    def save(self, filename):
+        with open(filename, "wb") as file:
+            file.write(self.getBytes())
+
+
+class ReplayRandom:
+    # Stands in for random.Random of a GameState and picks the recorded apple
+    # tiles instead of random ones
+
+    def __init__(self, state, spawns, next):
+        self.state = state
+        self.spawns = spawns
+        self.next = next
+
+
+    def randrange(self, n):
+        tile = self.spawns[self.next]
+        self.next += 1
+        return self.state.freeTiles.positionOf(tile)
+
+
+class Replay:
+    # Recorded game, played again through the rules of Simulation
+
+    def __init__(self, data):
+        data = bytearray(data)  # bytes of Python 2 are str, indexing gives characters
+        if data[:4] != MAGIC:
+            raise ValueError("Not a snake replay.")
+        position = 4
+        version, position = readVarint(data, position)
+        if version != VERSION:
+            raise ValueError("Unsupported replay version: " + str(version))
+        self.GRIDSIZE, position = readVarint(data, position)
+        self.snapshotInterval, position = readVarint(data, position)
+        self.ticks, position = readVarint(data, position)
+
+        size, position = readVarint(data, position)
+        self.directions = data[position:position + size]
+        position += size
+
+        count, position = readVarint(data, position)
+        self.spawns = array("l")
+        for i in range(count):
+            tile, position = readVarint(data, position)
+            self.spawns.append(tile)
+
+        # Snapshots as (tick, spawns so far, direction, size, apple + 1, snake tiles)
+        count, position = readVarint(data, position)
+        self.snapshots = list()
+        for i in range(count):
+            values = list()
+            for k in range(6):
+                value, position = readVarint(data, position)
+                values.append(value)
+            snake = list()
+            for k in range(values[5]):
+                tile, position = readVarint(data, position)
+                snake.append(tile)
+            values[5] = snake
+            self.snapshots.append(tuple(values))
+        self.snapshotTicks = [snapshot[0] for snapshot in self.snapshots]
+
+
+    # Reads a replay from a file
+    @staticmethod
+    def load(filename):
+        with open(filename, "rb") as file:
+            return Replay(file.read())
+
+
+    # Returns the direction of the given tick
+    def getDirection(self, tick):
+        return ACTIONS[(self.directions[tick // 4] >> (2 * (tick % 4))) & 3]
+
+
+    # Returns a Simulation in the state after the given number of ticks,
+    # starting at the last snapshot before
+    def seek(self, tick):
+        if tick < 0 or tick > self.ticks:
+            raise ValueError("Tick out of range.")
+        tickNow, spawns, action, size, apple, snake = self.snapshots[bisect_right(self.snapshotTicks, tick) - 1]
+
+        G = self.GRIDSIZE
+        simulation = Simulation(G)
+        state = simulation.state
+        state.setSnake([(t % G, t // G) for t in snake])
+        state.size = size
+        if apple > 0:
+            state.placeApple(((apple - 1) % G, (apple - 1) // G))
+        state.random = ReplayRandom(state, self.spawns, spawns)
+        simulation.direction = ACTIONS[action]
+        simulation.ticks = tickNow
+
+        while simulation.ticks < tick:
+            simulation.step(self.getDirection(simulation.ticks))
+        return simulation
+
+
+    # Plays the game from the given tick to the end, yields the events of every tick
+    def play(self, tick = 0):
+        simulation = self.seek(tick)
+        while simulation.ticks < self.ticks:
+            yield simulation.step(self.getDirection(simulation.ticks))
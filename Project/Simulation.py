@@ -0,0 +1,138 @@
+from GameState import *
+try:
+    from time import perf_counter as clock
+except ImportError:
+    from time import time as clock
+
+
+class Simulation:
+    # Snake game without GUI and without waiting, one call of step() is one tick.
+    # step() returns the events of the tick as list of tuples:
+    #   ("eat", (x, y))     the snake ate the apple on this tile
+    #   ("spawn", (x, y))   a new apple was placed on this tile
+    #   ("death", cause)    the game is over, cause is "wall", "self" or "full"
+    # Same seed and same directions give the same game.
+
+    def __init__(self, GRIDSIZE = 10, seed = None, recordDelta = False):
+        self.GRIDSIZE = GRIDSIZE
+        self.recordDelta = recordDelta
+        self.reset(seed)
+
+
+    # Starts a new game
+    def reset(self, seed = None):
+        self.seed = seed
+        self.state = GameState(self.GRIDSIZE, seed, self.recordDelta)
+        self.direction = "right"
+        self.ticks = 0
+        self.alive = True
+
+
+    # Moves the snake one tile in the given direction (None: keep the direction)
+    def step(self, direction = None):
+        if not self.alive:
+            raise Exception("Game is over, call reset() first.")
+        if direction is not None:
+            self.direction = direction
+        state = self.state
+        self.ticks += 1
+
+        head = state.nextHead(self.direction)
+        if not state.isInside(head):
+            return self.die([], "wall")
+
+        events = []
+        eat = state.appleBool and head == (state.applex, state.appley)
+        if not state.moveSnake(head, eat):
+            return self.die(events, "self")
+
+        if eat:
+            state.addSize()
+            state.appleBool = False
+            events.append(("eat", head))
+
+        if not state.appleBool:
+            # No tile left for the apple, the snake fills the whole grid
+            if len(state.freeTiles) == 0:
+                return self.die(events, "full")
+            tile = state.randomFreeTile()
+            state.placeApple(tile)
+            events.append(("spawn", tile))
+        return events
+
+
+    # Ends the game
+    def die(self, events, cause):
+        self.alive = False
+        events.append(("death", cause))
+        return events
+
+
+    # Returns the score (length of the snake)
+    def getScore(self):
+        return self.state.size
+
+
+    # Returns the tile of the apple or None
+    def getApple(self):
+        if self.state.appleBool:
+            return (self.state.applex, self.state.appley)
+        return None
+
+
+# Bot moving to the apple on the shortest way, avoiding walls and the snake
+def greedyBot(simulation):
+    state = simulation.state
+    snake = state.snake
+    tail = snake.getTail()
+    apple = simulation.getApple()
+    best = None
+    bestDistance = None
+    for direction in DIRECTIONS:
+        head = state.nextHead(direction)
+        if not state.isInside(head) or (snake.collides(head) and head != tail):
+            continue
+        if apple is None:
+            return direction
+        distance = abs(head[0] - apple[0]) + abs(head[1] - apple[1])
+        if best is None or distance < bestDistance:
+            best = direction
+            bestDistance = distance
+    if best is None:
+        return simulation.direction
+    return best
+
+
+# Bot keeping the current direction
+def straightBot(simulation):
+    return None
+
+
+# Plays games with the bot until the given number of ticks is done, a new game
+# starts when a game is over. Game n is seeded with seed + n (if seed is not None).
+# Returns a dict with the numbers of ticks and games, the scores and the ticks per second
+def runSimulation(bot, ticks, GRIDSIZE = 10, seed = None):
+    simulation = Simulation(GRIDSIZE, seed)
+    step = simulation.step
+    scores = []
+    start = clock()
+    for tick in range(ticks):
+        step(bot(simulation))
+        if not simulation.alive:
+            scores.append(simulation.getScore())
+            if seed is not None:
+                simulation.reset(seed + len(scores))
+            else:
+                simulation.reset()
+    elapsed = clock() - start
+    return {"ticks": ticks, "games": len(scores), "scores": scores, "elapsed": elapsed,
+            "ticksPerSecond": ticks / elapsed if elapsed > 0 else float("inf")}
+
+
+if __name__ == "__main__":
+    for name, bot in (("straight", straightBot), ("greedy", greedyBot)):
+        result = runSimulation(bot, 1000000, 10, 1)
+        scores = result["scores"]
+        print(name, result["ticks"], "ticks,", result["games"], "games,",
+              "%.0f ticks/s," % result["ticksPerSecond"],
+              "mean score %.2f" % (sum(scores) / max(len(scores), 1)))
@@ -0,0 +1,143 @@
+from Simulation import *
+from multiprocessing import Pool
+from array import array
+import math
+import sys
+
+# Bots taking part, workers look them up by name
+BOTS = {"straight": straightBot, "greedy": greedyBot}
+
+# Causes of death in the result records, "timeout" if maxTicks is reached
+CAUSES = ("wall", "self", "full", "timeout")
+
+# Fields of a result record
+FIELDS = ("seed", "score", "length", "ticks", "cause")
+
+
+# Plays one game without GUI, returns the record (seed, score, length, ticks, cause index)
+def playGame(bot, GRIDSIZE, seed, maxTicks):
+    simulation = Simulation(GRIDSIZE, seed)
+    step = simulation.step
+    events = None
+    while simulation.alive and simulation.ticks < maxTicks:
+        events = step(bot(simulation))
+    if simulation.alive:
+        cause = CAUSES.index("timeout")
+    else:
+        cause = CAUSES.index(events[-1][1])
+    return (seed, simulation.getScore(), len(simulation.state.snake), simulation.ticks, cause)
+
+
+# Worker: plays the games with the seeds first .. first + count - 1, the records
+# go back to the parent as one flat array of ints
+def playShard(shard):
+    botName, GRIDSIZE, first, count, maxTicks = shard
+    bot = BOTS[botName]
+    records = array("l")
+    for seed in range(first, first + count):
+        records.extend(playGame(bot, GRIDSIZE, seed, maxTicks))
+    return botName, records
+
+
+class RunningStats:
+    # Count, mean, standard deviation, min and max of a stream of numbers,
+    # updated per value (Welford), nothing of the stream is stored
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+
+    # Returns the standard deviation of the values
+    def getStd(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self.m2 / (self.count - 1))
+
+
+    def __str__(self):
+        return "mean %.2f, std %.2f, min %s, max %s" % (self.mean, self.getStd(), self.min, self.max)
+
+
+class BotStats:
+    # Statistics of all games of one bot
+
+    def __init__(self, name):
+        self.name = name
+        self.games = 0
+        self.score = RunningStats()
+        self.length = RunningStats()
+        self.ticks = RunningStats()
+        self.causes = [0] * len(CAUSES)
+
+
+    # Adds the records of a flat array of ints
+    def addRecords(self, records):
+        n = len(FIELDS)
+        for i in range(0, len(records), n):
+            self.games += 1
+            self.score.add(records[i + 1])
+            self.length.add(records[i + 2])
+            self.ticks.add(records[i + 3])
+            self.causes[records[i + 4]] += 1
+
+
+    def __str__(self):
+        causes = ", ".join("%s %d" % (cause, n) for cause, n in zip(CAUSES, self.causes) if n > 0)
+        return "\n".join([self.name + ": " + str(self.games) + " games",
+                          "  score:  " + str(self.score),
+                          "  length: " + str(self.length),
+                          "  ticks:  " + str(self.ticks),
+                          "  deaths: " + causes])
+
+
+# Plays games games for each bot in a pool of processes (default: one per core).
+# Game n of every bot is seeded with seed + n, so all bots get the same apples.
+# The games are split into shards of shardSize games, the statistics are updated
+# as soon as a shard is done. Returns a dict bot name -> BotStats
+def runTournament(botNames, games, GRIDSIZE = 10, seed = 0, processes = None,
+                  shardSize = 500, maxTicks = None):
+    if maxTicks is None:
+        maxTicks = 100 * GRIDSIZE * GRIDSIZE
+    shards = list()
+    for botName in botNames:
+        if botName not in BOTS:
+            raise ValueError("Unknown bot: " + botName)
+        for first in range(seed, seed + games, shardSize):
+            shards.append((botName, GRIDSIZE, first, min(shardSize, seed + games - first), maxTicks))
+
+    stats = dict((botName, BotStats(botName)) for botName in botNames)
+    pool = Pool(processes)
+    try:
+        for botName, records in pool.imap_unordered(playShard, shards):
+            stats[botName].addRecords(records)
+    finally:
+        pool.close()
+        pool.join()
+    return stats
+
+
+if __name__ == "__main__":
+    games = 10000
+    if len(sys.argv) > 1:
+        games = int(sys.argv[1])
+    start = clock()
+    stats = runTournament(sorted(BOTS), games)
+    elapsed = clock() - start
+    for botName in sorted(stats):
+        print(stats[botName])
+    print("%d games in %.1f s" % (games * len(stats), elapsed))
@@ -0,0 +1,160 @@
+import numpy as np
+from random import Random
+from GameState import EMPTY, SNAKE, APPLE, DIRECTIONS, ACTIONS, FreeTiles
+
+# Actions of VecSnake.step() are indices into ACTIONS
+DX = np.array([DIRECTIONS[action][0] for action in ACTIONS])
+DY = np.array([DIRECTIONS[action][1] for action in ACTIONS])
+
+# Causes of the end of a game
+ALIVE = 0
+WALL = 1
+SELF = 2
+FULL = 3
+
+
+class VecSnake:
+    # N snake games stored in NumPy arrays and stepped together, tile index
+    # y * GRIDSIZE + x as in GameState:
+    #   board      (N, GRIDSIZE*GRIDSIZE) uint8 tile states EMPTY, SNAKE, APPLE
+    #   body       (N, GRIDSIZE*GRIDSIZE) ring buffer of the snake tiles, the head at headPos
+    #   tiles      (N, GRIDSIZE*GRIDSIZE) pool of the free tiles (first freeCount entries)
+    #   positions  (N, GRIDSIZE*GRIDSIZE) position of each tile in the pool or -1
+    #   apple      (N,) tile of the apple or -1
+    #   score      (N,) length of the snake
+    # The rules, the free tile pool and the apple random generators are the same
+    # as in Simulation, so a game with the same seed and actions runs the same way.
+    # Finished games are reset automatically. Game number n (counted over all
+    # resets, the first N games in order of the index) is seeded with seed + n.
+
+    def __init__(self, N, GRIDSIZE = 10, seed = None):
+        if GRIDSIZE < 3:
+            raise ValueError("GRIDSIZE must be at least 3.")
+        self.N = N
+        self.GRIDSIZE = GRIDSIZE
+        self.seed = seed
+        self.games = 0
+        self.index = np.arange(N)
+        cap = GRIDSIZE * GRIDSIZE
+
+        # Free tile pool of a new game, built like in GameState
+        free = FreeTiles(GRIDSIZE)
+        for tile in ((2, 0), (1, 0), (0, 0)):
+            free.remove(tile)
+        self.startTiles = np.zeros(cap, np.int32)
+        self.startTiles[:len(free)] = [free.tileAt(position) for position in range(len(free))]
+        self.startPositions = np.array([free.positionOf(index) for index in range(cap)], np.int32)
+
+        self.board = np.zeros((N, cap), np.uint8)
+        self.body = np.zeros((N, cap), np.int32)
+        self.headPos = np.zeros(N, np.int32)
+        self.length = np.zeros(N, np.int32)
+        self.tiles = np.zeros((N, cap), np.int32)
+        self.positions = np.zeros((N, cap), np.int32)
+        self.freeCount = np.zeros(N, np.int32)
+        self.apple = np.zeros(N, np.int32)
+        self.score = np.zeros(N, np.int32)
+        self.direction = np.zeros(N, np.int8)
+        self.rngs = [None] * N
+        self.random = Random()
+        self.reset(np.ones(N, bool))
+
+
+    # Starts new games for the games selected by the boolean mask
+    def reset(self, mask):
+        games = self.index[mask]
+        self.board[games] = EMPTY
+        self.board[games, 0:3] = SNAKE
+        self.body[games, 0:3] = (0, 1, 2)
+        self.headPos[games] = 2
+        self.length[games] = 3
+        self.tiles[games] = self.startTiles
+        self.positions[games] = self.startPositions
+        self.freeCount[games] = len(self.startTiles) - 3
+        self.apple[games] = -1
+        self.score[games] = 3
+        self.direction[games] = 0
+        if self.seed is None:
+            # Without seed all games can share one generator
+            for game in games:
+                self.rngs[game] = self.random
+            self.games += len(games)
+            return
+        for game in games:
+            self.rngs[game] = Random(self.seed + self.games)
+            self.games += 1
+
+
+    # Moves all snakes one tile, actions is an array of N indices into ACTIONS
+    # (None: keep the directions). Returns the arrays eaten (bool), done (bool),
+    # cause (ALIVE, WALL, SELF, FULL) and score, taken before finished games are reset
+    def step(self, actions = None):
+        if actions is not None:
+            self.direction[:] = actions
+        G = self.GRIDSIZE
+        cap = G * G
+        index = self.index
+        actions = self.direction
+
+        head = self.body[index, self.headPos]
+        x = head % G + DX[actions]
+        y = head // G + DY[actions]
+        wall = (x < 0) | (x >= G) | (y < 0) | (y >= G)
+        cell = np.where(wall, 0, y * G + x)
+        eat = ~wall & (cell == self.apple)
+
+        # The last segment moves away, unless the snake grows
+        games = index[~wall & ~eat]
+        tail = self.body[games, (self.headPos[games] - self.length[games] + 1) % cap]
+        self.board[games, tail] = EMPTY
+        self.positions[games, tail] = self.freeCount[games]
+        self.tiles[games, self.freeCount[games]] = tail
+        self.freeCount[games] += 1
+        self.length[games] -= 1
+
+        # Bite itself or move the head
+        bite = ~wall & (self.board[index, cell] == SNAKE)
+        moved = ~wall & ~bite
+        games = index[moved]
+        cell = cell[games]
+        self.headPos[games] = (self.headPos[games] + 1) % cap
+        self.body[games, self.headPos[games]] = cell
+        self.length[games] += 1
+        self.board[games, cell] = SNAKE
+
+        # Remove the head tile from the pool, the last entry takes its place
+        position = self.positions[games, cell]
+        last = self.tiles[games, self.freeCount[games] - 1]
+        self.tiles[games, position] = last
+        self.positions[games, last] = position
+        self.positions[games, cell] = -1
+        self.freeCount[games] -= 1
+
+        eaten = eat & moved
+        self.score[eaten] += 1
+        self.apple[eaten] = -1
+
+        # New apples, the game is won if no tile is left
+        spawn = moved & (self.apple < 0)
+        full = spawn & (self.freeCount == 0)
+        for game in index[spawn & ~full]:
+            tile = self.tiles[game, self.rngs[game].randrange(self.freeCount[game])]
+            self.apple[game] = tile
+            self.board[game, tile] = APPLE
+
+        done = wall | bite | full
+        cause = np.zeros(self.N, np.int8)
+        cause[wall] = WALL
+        cause[bite] = SELF
+        cause[full] = FULL
+        score = self.score.copy()
+        if done.any():
+            self.reset(done)
+        return eaten, done, cause, score
+
+
+    # Returns the snake tiles of one game as list of (x, y), head first
+    def getSnake(self, game):
+        cap = self.GRIDSIZE * self.GRIDSIZE
+        positions = (self.headPos[game] - np.arange(self.length[game])) % cap
+        return [(int(tile % self.GRIDSIZE), int(tile // self.GRIDSIZE)) for tile in self.body[game, positions]]
@@ -43,10 +43,25 @@ order, e.g. window(0, 500, 400, 0).
 
 WARNING: Because PyQt is not thread-safe, in principle all graphics drawings should be
 executed in the GUI thread (for GPanel the main thread or a GUI callback).
+With makeGPanel(..., threaded = True) the drawings may be called from any thread:
+they are queued and performed by a render thread in image buffers, the GUI thread
+only renders the finished drawings in the window.
 
 In order to get notifications for keyboard and mouse callbacks, the main thread should
 not be blocked otherwise than within the keep() function.
 
+For pixel graphics use a GBitmap(width, height): with NumPy its pixels are a NumPy
+array shared with the image (see GBitmap.getArray()), draw it with image(bitmap, x, y).
+
+To run without a display (batch jobs, regression renders), set the environment variable
+GPANEL_HEADLESS=1 or call makeGPanel(..., headless = True). Then no window is shown,
+all drawings go into an image buffer and keep() returns immediately. Use saveImage()
+or set GPANEL_OUTPUT=<file.png> to save the graphics when the program terminates.
+
+Static graphics (grids, labels) can be drawn into its own layer, see addLayer() and
+setLayer(). Layers are composited when the window is rendered, a layer that is not
+drawn into is never drawn again.
+
 Typical program:
 
 from pygpanel import *
@@ -65,9 +80,27 @@ from __future__ import division
 from PyQt4 import QtGui, QtCore
 from PyQt4.QtGui import *
 from PyQt4.QtCore import *
-import thread
-import sys, time, math
+try:
+    import thread
+except ImportError:
+    import _thread as thread
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+import sys, os, time, math, numbers, inspect, atexit, threading, traceback, struct
+from contextlib import contextmanager
+from collections import deque
+from array import array
 import random
+try:
+    import sip
+except ImportError:
+    from PyQt4 import sip
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
 
 _p = None
 isTigerJython = False
@@ -92,18 +125,26 @@ def makeGPanel(*args, **kwargs):
     1 Parameter: Size(window_width, window_height).
     4 Parameters: xmin, xmax, ymin, ymax.
 
+    If headless = True or the environment variable GPANEL_HEADLESS is set (and not "0"),
+    no window is shown. All drawings are performed in an image buffer only,
+    use getFullImage() or saveImage() to get the result.
+
+    If threaded = True, the drawing operations may be called from any thread.
+    They are queued and performed by a render thread, the GUI thread only renders
+    the finished drawings in the window.
+
     KEEP IN MIND: To use GUI callbacks, the main program must block in the keep() function.
     @param Size: a Size reference to define the dimension of the graphics windows.
     @param xmin: left x user coordinate
     @param xmax: right x user coordinate
     @param ymin: lower y  user coordinate
     @param ymax: upper y user coordinate
-    @param kwargs: mousePressed, mouseReleased, mouseDragged, keyPressed, keyReleased, closed
+    @param kwargs: mousePressed, mouseReleased, mouseDragged, keyPressed, keyReleased, closed, headless, threaded
     '''
     global _p
 
     if _p == None:
-        _p = GPanel(*args)
+        _p = GPanel(*args, headless = kwargs.get("headless"), threaded = kwargs.get("threaded"))
 
     for key in kwargs:
         if key == "mousePressed":
@@ -154,6 +195,18 @@ def addKeyReleaseListener(onKeyReleased):
     _isGPanelValid()
     _p.addKeyReleaseListener(onKeyReleased)
 
+def addLayer(name, z = None):
+    '''
+    Adds a new transparent layer. The layers are composited in the order of
+    their z values when the window is rendered, the base layer "base" with
+    the background color has z = 0. A layer keeps its graphics until it is
+    drawn into or cleared, so static graphics in its own layer is never drawn again.
+    @param name: the name of the layer
+    @param z: the stacking order (default: above all other layers)
+    '''
+    _isGPanelValid()
+    _p.addLayer(name, z)
+
 def addMouseDragListener(onMouseDragged):
     '''
     Registers a callback that is invoked when the mouse is moved while a mouse button is pressed (drag).
@@ -234,11 +287,22 @@ def clear():
     _isGPanelValid()
     _p.clear()
 
+def clearLayer(name = None):
+    '''
+    Clears the given layer (default: the current layer). The base layer
+    is painted with the background color, other layers become transparent.
+    @param name: the name of the layer
+    '''
+    _isGPanelValid()
+    _p.clearLayer(name)
+
 def delay(delayTime):
     '''
-    Stop execution for given delay time.
+    Stop execution for given delay time. Pending changes are rendered before.
     @param delayTime: the delay time (in ms)
     '''
+    if _p != None:
+        _p.flush()
     time.sleep(delayTime / 1000.0)
 
 def draw(*args):
@@ -292,6 +356,54 @@ def enableRepaint(enable):
     _isGPanelValid()
     _p.enableRepaint(enable)
 
+def beginFrame():
+    '''
+    Starts a frame. Until the matching endFrame(), all drawing operations
+    are only performed in the offscreen buffer and the graphics window
+    is rendered once when the frame ends. Frames may be nested.
+    '''
+    _isGPanelValid()
+    _p.beginFrame()
+
+def endFrame():
+    '''
+    Ends a frame started with beginFrame() and renders the graphics window.
+    Returns the number of drawing operations coalesced in the frame.
+    '''
+    _isGPanelValid()
+    return _p.endFrame()
+
+@contextmanager
+def frame():
+    '''
+    Context manager for beginFrame()/endFrame():
+
+    with frame():
+        for i in range(100):
+            line(0, 0, 1, i / 100)
+    '''
+    _isGPanelValid()
+    _p.beginFrame()
+    try:
+        yield _p
+    finally:
+        _p.endFrame()
+
+def flush():
+    '''
+    Renders all changes in the graphics window at once (regardless of the maximum frame rate).
+    '''
+    _isGPanelValid()
+    _p.flush()
+
+def getFrameCount():
+    '''
+    Returns the number of drawing operations coalesced in the current frame
+    or, if no frame is active, in the last frame.
+    '''
+    _isGPanelValid()
+    return _p.getFrameCount()
+
 def erase():
     '''
     Same as clear(), but lets the current graph cursor unganged.
@@ -345,6 +457,17 @@ def fillCircle(radius):
     _isGPanelValid()
     _p.fillCircle(radius)
 
+def fillCircles(centers, radii, colors = None):
+    '''
+    Draws many filled circles in one operation (with one repaint).
+    The circles are drawn grouped by color.
+    @param centers: list of centers [x, y] (or NumPy array of shape (n, 2))
+    @param radii: one radius for all circles or a list with a radius for each circle
+    @param colors: None for the current pen color, one color or a list with a color for each circle
+    '''
+    _isGPanelValid()
+    _p.fillCircles(centers, radii, colors)
+
 def fillEllipse(a, b):
     '''
     Draws a filled ellipse with center at the current graph cursor position
@@ -429,6 +552,17 @@ def getFullImage():
     _isGPanelValid()
     return _p.getFullImage()
 
+def saveImage(filename, pic_format = None):
+    '''
+    Saves the complete graphics area in a picture file. For pic_format = None,
+    the picture format is guessed from the file suffix.
+    @param filename: the file path of the picture file
+    @param pic_format: format of picture, e.g. "PNG" (default: None)
+    @return: True, if operation is successful; otherwise false
+    '''
+    _isGPanelValid()
+    return _p.saveImage(filename, pic_format)
+
 def getImage(filename):
     '''
     Same as loadImage(filename)
@@ -446,6 +580,13 @@ def loadImage(filename, pic_format = None):
     '''
     return GPanel.loadImage(filename, pic_format)
 
+def getLayer():
+    '''
+    Returns the name of the current layer.
+    '''
+    _isGPanelValid()
+    return _p.getLayer()
+
 def getPainter():
     '''
     Returns the QPainter reference used to draw into the offscreen buffer.
@@ -461,13 +602,26 @@ def getPixelColor(*args):
     _isGPanelValid()
     return _p.getPixelColor(*args)
     
-def getPixelColorStr(*args):
+def getPixelColors(xs, ys):
+    '''
+    Returns the RGBA colors of the pixels with given user coordinates
+    as a list of RGBA tuples. If NumPy arrays are given, a NumPy array
+    of shape (n, 4) is returned.
+    @param xs: the x coordinates (list, tuple, array)
+    @param ys: the corresponding y coordinates (list, tuple, array)
+    '''
+    _isGPanelValid()
+    return _p.getPixelColors(xs, ys)
+
+def getPixelColorStr(*args, **kwargs):
     '''
     Returns the X11 color string of a pixel with given user coordinates.
     No params: Returns color at current graph cursor position.
+    With nearest = True the name of the nearest X11 color is returned
+    if there is no exact match (e.g. for antialiased pixels).
     '''
     _isGPanelValid()
-    return _p.getPixelColorStr(*args)
+    return _p.getPixelColorStr(*args, **kwargs)
 
 def getPos():
     '''
@@ -572,6 +726,16 @@ def line(*args):
     _isGPanelValid()
     _p.line(x1, y1, x2, y2)
 
+def lines(segments, colors = None):
+    '''
+    Draws many lines in one operation (with one repaint).
+    The lines are drawn grouped by color.
+    @param segments: list of [x1, y1, x2, y2] or [pt1, pt2] (or NumPy array of shape (n, 4))
+    @param colors: None for the current pen color, one color or a list with a color for each line
+    '''
+    _isGPanelValid()
+    _p.lines(segments, colors)
+
 def lineWidth(width):
     '''
     Sets the current pen size (width) (>=1).
@@ -612,6 +776,16 @@ def point(*args):
     _isGPanelValid()
     _p.point(*args)
 
+def points(xy, colors = None):
+    '''
+    Draws many points with current pen size in one operation (with one repaint).
+    The points are drawn grouped by color.
+    @param xy: list of points [x, y] (or NumPy array of shape (n, 2))
+    @param colors: None for the current pen color, one color or a list with a color for each point
+    '''
+    _isGPanelValid()
+    _p.points(xy, colors)
+
 def linePlot(*args):
     '''
     Draws a line plot with given x,y data.
@@ -657,6 +831,24 @@ def rectangle(*args):
     _isGPanelValid()
     _p.rectangle(*args)
 
+def rectangles(rects, colors = None):
+    '''
+    Draws many rectangles in one operation (with one repaint).
+    The rectangles are drawn grouped by color.
+    @param rects: list of diagonals [x1, y1, x2, y2] or [pt1, pt2] (or NumPy array of shape (n, 4))
+    @param colors: None for the current pen color, one color or a list with a color for each rectangle
+    '''
+    _isGPanelValid()
+    _p.rectangles(rects, colors)
+
+def removeLayer(name):
+    '''
+    Removes the layer with the given name (not the base layer).
+    @param name: the name of the layer
+    '''
+    _isGPanelValid()
+    _p.removeLayer(name)
+
 def repaint():
     '''
     Renders the offscreen buffer in the graphics window.
@@ -721,6 +913,26 @@ def setPaintMode():
     _isGPanelValid()
     _p.setPaintMode()
 
+def setLayer(name):
+    '''
+    Selects the layer all following drawing operations are performed in.
+    @param name: the name of the layer ("base" for the base layer)
+    '''
+    _isGPanelValid()
+    _p.setLayer(name)
+
+def setMaxFrameRate(fps):
+    '''
+    Sets the maximum number of times per second the graphics window is rendered
+    (default: 0, every drawing operation is rendered at once; 60 in threaded mode).
+    Drawing operations are not slowed down, they are rendered together with the
+    next frame, which is rendered by a timer of the Qt event loop, so with a
+    maximum frame rate call flush() (or delay()) before time.sleep().
+    @param fps: frames per second, 0 to render after every drawing operation
+    '''
+    _isGPanelValid()
+    _p.setMaxFrameRate(fps)
+
 def setPenColor(*args):
     '''
     Sets the current pen color.
@@ -790,6 +1002,22 @@ def setXORMode(*args):
     _p.setXORMode()
 
 
+def startRecording():
+    '''
+    Starts recording the drawing commands in a display list. Returns the DisplayList.
+    Use its replay() to perform the commands again (e.g. in a headless GPanel of
+    another size) and getStatistics() to see which commands took the most time.
+    '''
+    _isGPanelValid()
+    return _p.startRecording()
+
+def stopRecording():
+    '''
+    Stops recording and returns the DisplayList.
+    '''
+    _isGPanelValid()
+    return _p.stopRecording()
+
 def startPath():
     '''
     Starts recording the path vertexes. The positions of subsequent draw() operations are saved.
@@ -838,7 +1066,7 @@ def toPixelHeight(userHeight):
     Returns pixel y-increment of given user y-increment (always positive).
     '''
     _isGPanelValid()
-    return p.toPixelHeight(userHeight)
+    return _p.toPixelHeight(userHeight)
 
 def toPixelWidth(userWidth):
     '''
@@ -896,6 +1124,24 @@ def toUserY(pixelY):
     _isGPanelValid()
     return _p.toUserY(pixelY)
 
+def toPixelArray(xs, ys):
+    '''
+    Returns the pixel coordinates of all given user coordinates in one pass
+    as tuple of two integer arrays (NumPy arrays if NumPy is installed,
+    otherwise array('i')).
+    '''
+    _isGPanelValid()
+    return _p.toPixelArray(xs, ys)
+
+def toUserArray(xs, ys):
+    '''
+    Returns the user coordinates of all given pixel coordinates in one pass
+    as tuple of two float arrays (NumPy arrays if NumPy is installed,
+    otherwise array('d')).
+    '''
+    _isGPanelValid()
+    return _p.toUserArray(xs, ys)
+
 def triangle(*args):
     '''
     Draws a triangle with given corners.
@@ -965,6 +1211,175 @@ def _get2Coords(*args):
 
 # ------------------------ end of GPanel methods -----------
 
+def _columns(rows, n):
+    # Returns the n columns of the given rows (list of n values or of points)
+    if _np is not None and isinstance(rows, _np.ndarray):
+        return [rows[:, i] for i in range(n)]
+    flat = []
+    for row in rows:
+        if len(row) == n:
+            flat.append(row)
+        else:
+            flat.append([v for pt in row for v in pt])
+    return [[row[i] for row in flat] for i in range(n)]
+
+def _packRGB(color):
+    # RGB list/tuple to opaque 32-bit pixel value 0xffRRGGBB
+    return 0xFF000000 | (color[0] << 16) | (color[1] << 8) | color[2]
+
+def _packRGBA(color):
+    # RGB/RGBA list/tuple or X11 color string to 32-bit pixel value 0xAARRGGBB
+    if type(color) == str:
+        try:
+            color = x11ColorDict[color.lower()]
+        except KeyError:
+            raise ValueError("X11 color", color, "not found")
+    alpha = color[3] if len(color) > 3 else 255
+    return (alpha << 24) | (color[0] << 16) | (color[1] << 8) | color[2]
+
+def _unpackRGBA(pixel):
+    # 32-bit pixel value 0xAARRGGBB to RGBA tuple
+    return (pixel >> 16) & 0xFF, (pixel >> 8) & 0xFF, pixel & 0xFF, (pixel >> 24) & 0xFF
+
+_BASE_LAYER = "base"  # name of the layer with the background, created with the window
+
+_rgbaCache = {}  # X11 color string -> RGBA tuple (used by GPanel._toRGBA)
+
+_x11Names = None  # packed RGB -> canonical X11 color name, built on first use
+_x11Buckets = None  # spatial index: RGB cube cell -> list of (packed RGB, name)
+_x11Nearest = {}  # packed RGB -> nearest X11 color name (cache)
+_X11_CELL = 32  # edge length of a spatial index cell
+
+def _x11Index():
+    global _x11Names, _x11Buckets
+    if _x11Names == None:
+        names = {}
+        for name, rgb in x11ColorDict.items():
+            if name[-1].isdigit():  # skip names with ending number
+                continue
+            if " " in name:  # skip names with space
+                continue
+            if "grey" in name:  # skip British gray
+                continue
+            names.setdefault((rgb[0] << 16) | (rgb[1] << 8) | rgb[2], name)
+        buckets = {}
+        for key, name in names.items():
+            cell = ((key >> 16) // _X11_CELL, ((key >> 8) & 0xFF) // _X11_CELL, (key & 0xFF) // _X11_CELL)
+            buckets.setdefault(cell, []).append((key, name))
+        _x11Names = names
+        _x11Buckets = buckets
+    return _x11Names
+
+def _x11ColorName(r, g, b, nearest = False):
+    # Returns the canonical X11 name of the given color
+    key = (r << 16) | (g << 8) | b
+    name = _x11Index().get(key)
+    if name != None:
+        return name
+    if not nearest:
+        raise ValueError("X11 color", [r, g, b], "not found")
+    name = _x11Nearest.get(key)
+    if name == None:
+        name = _x11NearestName(r, g, b)
+        _x11Nearest[key] = name
+    return name
+
+def _x11NearestName(r, g, b):
+    # Searches the spatial index cells in rings of growing distance
+    # around the cell of (r, g, b) until no closer color is possible
+    cr = r // _X11_CELL
+    cg = g // _X11_CELL
+    cb = b // _X11_CELL
+    n = 256 // _X11_CELL
+    best = None
+    bestDist = None
+    for ring in range(n):
+        for i in range(max(0, cr - ring), min(n, cr + ring + 1)):
+            for k in range(max(0, cg - ring), min(n, cg + ring + 1)):
+                for m in range(max(0, cb - ring), min(n, cb + ring + 1)):
+                    if max(abs(i - cr), abs(k - cg), abs(m - cb)) != ring:
+                        continue
+                    for key, name in _x11Buckets.get((i, k, m), ()):
+                        dist = ((key >> 16) - r) ** 2 + (((key >> 8) & 0xFF) - g) ** 2 + ((key & 0xFF) - b) ** 2
+                        if bestDist == None or dist < bestDist:
+                            best = name
+                            bestDist = dist
+        if bestDist != None and bestDist <= (ring * _X11_CELL) ** 2:
+            break
+    return best
+
+def _rasterView(image):
+    # Returns a writable flat view of the 32-bit pixels of the given QImage
+    # (no copy, row after row)
+    ptr = image.bits()
+    ptr.setsize(image.byteCount())
+    view = memoryview(ptr)
+    if hasattr(view, "cast"):
+        return view.cast("I")
+    if _np is not None:
+        return _np.frombuffer(ptr, _np.uint32)  # Python 2 memoryviews cannot be cast
+    return _PixelView(view)
+
+class _PixelView(object):
+    # 32-bit pixels of a byte buffer (Python 2 without NumPy, slow but no copy)
+    def __init__(self, buffer):
+        self._buffer = buffer
+
+    def __len__(self):
+        return len(self._buffer) // 4
+
+    def __getitem__(self, i):
+        return struct.unpack_from("I", self._buffer, 4 * i)[0]
+
+    def __setitem__(self, i, value):
+        struct.pack_into("I", self._buffer, 4 * i, value)
+
+def _spanFill(view, width, height, x, y, oldColor, newColor):
+    # Span based flood fill of the 4-connected region of oldColor pixels
+    # containing (x, y). Returns the bounding box (x0, y0, x1, y1) of the
+    # changed pixels or None, if nothing was changed.
+    if oldColor == newColor or view[y * width + x] != oldColor:
+        return None
+    x0 = x1 = x
+    y0 = y1 = y
+    seeds = deque([(x, y)])
+    while seeds:
+        x, y = seeds.pop()
+        row = y * width
+        if view[row + x] != oldColor:
+            continue
+        left = x
+        while left > 0 and view[row + left - 1] == oldColor:
+            left -= 1
+        right = x
+        while right < width - 1 and view[row + right + 1] == oldColor:
+            right += 1
+        for i in range(row + left, row + right + 1):
+            view[i] = newColor
+        if left < x0:
+            x0 = left
+        if right > x1:
+            x1 = right
+        if y < y0:
+            y0 = y
+        if y > y1:
+            y1 = y
+        # one seed per run of old pixels in the rows above and below
+        for ny in (y - 1, y + 1):
+            if ny < 0 or ny >= height:
+                continue
+            nrow = ny * width
+            inRun = False
+            for i in range(nrow + left, nrow + right + 1):
+                if view[i] == oldColor:
+                    if not inRun:
+                        seeds.append((i - nrow, ny))
+                        inRun = True
+                else:
+                    inRun = False
+    return x0, y0, x1, y1
+
+
 def run(f):
     '''
     Calls f() in a new thread.
@@ -1014,6 +1429,223 @@ def linfit(X, Y):
 
 
 
+# ----------------------------- DisplayList class -------------------------
+_commandNames = []  # opcode -> name of the GPanel method (display list commands)
+_commandCodes = {}  # name of the GPanel method -> opcode
+_clock = getattr(time, "perf_counter", time.time)
+_argspec = getattr(inspect, "getfullargspec", None) or inspect.getargspec  # Python 2
+
+def _command(method):
+    # Decorator of the GPanel methods that are recorded in a display list.
+    # Only the outermost call is recorded, e.g. setColor() but not the
+    # setPenColor() called by it.
+    name = method.__name__
+    _commandCodes[name] = len(_commandNames)
+    _commandNames.append(name)
+    def recorded(self, *args, **kwargs):
+        if kwargs:
+            args = _positional(method, self, args, kwargs)
+        if self._renderQueue is not None and threading.current_thread() is not self._renderThread:
+            return self._enqueue(name, args)
+        if self._recorder is None or self._recordDepth > 0:
+            return method(self, *args)
+        self._recordDepth += 1
+        start = _clock()
+        try:
+            result = method(self, *args)
+        finally:
+            self._recordDepth -= 1
+        self._recorder.add(name, args, _clock() - start)
+        return result
+    recorded.__name__ = name
+    recorded.__doc__ = method.__doc__
+    return recorded
+
+def _positional(method, self, args, kwargs):
+    # Returns the parameters of a call with keyword parameters as positional
+    # parameters (display lists and the render queue only store these)
+    spec = _argspec(method)
+    values = inspect.getcallargs(method, self, *args, **kwargs)
+    args = [values[name] for name in spec.args[1:]]
+    if spec.varargs != None:
+        args.extend(values[spec.varargs])
+    return tuple(args)
+
+def _queued(method):
+    # Decorator of the GPanel methods that are performed in the render thread
+    # (in threaded mode), but not recorded in a display list
+    name = method.__name__
+    def queued(self, *args, **kwargs):
+        if kwargs:
+            args = _positional(method, self, args, kwargs)
+        if self._renderQueue is not None and threading.current_thread() is not self._renderThread:
+            return self._enqueue(name, args)
+        return method(self, *args)
+    queued.__name__ = name
+    queued.__doc__ = method.__doc__
+    return queued
+
+class DisplayList():
+    '''
+    Drawing commands of a GPanel recorded by startRecording().
+    Each command is stored as opcode (array of bytes), its parameters as
+    type tags (array of bytes) and numbers (array of doubles). Other
+    parameters (strings, images, NumPy arrays) are kept in a side table.
+    Drawings performed with the QPainter of getPainter() are not recorded.
+    '''
+    _NONE, _INT, _FLOAT, _COMPLEX, _LIST, _TUPLE, _OBJECT = range(7)
+
+    def __init__(self):
+        self.opcodes = array('B')
+        self.tags = array('B')
+        self.values = array('d')
+        self.objects = []
+        self._statistics = {}  # opcode -> [count, seconds]
+
+    def add(self, name, args, duration = 0.0):
+        '''
+        Appends a command.
+        @param name: the name of the GPanel method
+        @param args: the parameters (tuple)
+        @param duration: the time spent in the command (seconds)
+        '''
+        opcode = _commandCodes[name]
+        self.opcodes.append(opcode)
+        self.values.append(len(args))
+        for arg in args:
+            self._encode(arg)
+        entry = self._statistics.get(opcode)
+        if entry == None:
+            self._statistics[opcode] = [1, duration]
+        else:
+            entry[0] += 1
+            entry[1] += duration
+
+    def _encode(self, value):
+        t = type(value)
+        if value is None:
+            self.tags.append(self._NONE)
+        elif t == int and -2**53 <= value <= 2**53:
+            self.tags.append(self._INT)
+            self.values.append(value)
+        elif t == float:
+            self.tags.append(self._FLOAT)
+            self.values.append(value)
+        elif t == complex:
+            self.tags.append(self._COMPLEX)
+            self.values.append(value.real)
+            self.values.append(value.imag)
+        elif t == list or t == tuple:
+            self.tags.append(self._LIST if t == list else self._TUPLE)
+            self.values.append(len(value))
+            for item in value:
+                self._encode(item)
+        else:
+            if _np != None and isinstance(value, _np.ndarray):
+                value = value.copy()  # the caller may change the array later
+            self.tags.append(self._OBJECT)
+            self.values.append(len(self.objects))
+            self.objects.append(value)
+
+    def _decode(self, tags, values):
+        tag = next(tags)
+        if tag == self._NONE:
+            return None
+        if tag == self._INT:
+            return int(next(values))
+        if tag == self._FLOAT:
+            return next(values)
+        if tag == self._COMPLEX:
+            return complex(next(values), next(values))
+        if tag == self._OBJECT:
+            return self.objects[int(next(values))]
+        items = [self._decode(tags, values) for i in range(int(next(values)))]
+        if tag == self._TUPLE:
+            return tuple(items)
+        return items
+
+    def __iter__(self):
+        '''
+        Iterates over the commands as (name, parameter tuple).
+        '''
+        tags = iter(self.tags)
+        values = iter(self.values)
+        for opcode in self.opcodes:
+            n = int(next(values))
+            args = tuple([self._decode(tags, values) for i in range(n)])
+            yield _commandNames[opcode], args
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def replay(self, target = None):
+        '''
+        Performs the recorded commands in one frame (the window is rendered once).
+        Layers the target already has are not added again, but used.
+        Returns the GPanel.
+        @param target: a GPanel, a Size for a new headless GPanel of this size
+        (e.g. to render at another resolution) or None for the current GPanel
+        '''
+        if target == None:
+            _isGPanelValid()
+            target = _p
+        elif isinstance(target, Size):
+            target = GPanel(target, headless = True)
+        target.beginFrame()
+        try:
+            for name, args in self:
+                if name == "addLayer" and args[0] in target._layers:
+                    continue
+                getattr(target, name)(*args)
+        finally:
+            target.endFrame()
+        return target
+
+    def diff(self, other):
+        '''
+        Compares the commands with the commands of another display list.
+        Returns a list of (index, command, other command) of all different
+        commands (None for a missing command).
+        '''
+        mine = list(self)
+        others = list(other)
+        result = []
+        for i in range(max(len(mine), len(others))):
+            a = mine[i] if i < len(mine) else None
+            b = others[i] if i < len(others) else None
+            if not _sameValue(a, b):
+                result.append((i, a, b))
+        return result
+
+    def getStatistics(self):
+        '''
+        Returns a list of (command name, count, seconds) with the number of
+        calls and the time spent (while recording) for each command,
+        the most expensive command first.
+        '''
+        statistics = [(_commandNames[opcode], entry[0], entry[1])
+                      for opcode, entry in self._statistics.items()]
+        statistics.sort(key = lambda entry: entry[2], reverse = True)
+        return statistics
+
+    def printStatistics(self):
+        '''
+        Prints the command statistics as table.
+        '''
+        total = sum(entry[2] for entry in self.getStatistics()) or 1
+        print("%-16s %8s %10s %6s" % ("command", "count", "ms", "%"))
+        for name, count, seconds in self.getStatistics():
+            print("%-16s %8d %10.3f %6.1f" % (name, count, seconds * 1000, 100 * seconds / total))
+
+def _sameValue(a, b):
+    # equality of (nested) command parameters, NumPy arrays compared elementwise
+    if _np != None and (isinstance(a, _np.ndarray) or isinstance(b, _np.ndarray)):
+        return _np.array_equal(a, b)
+    if type(a) in (list, tuple) and type(b) in (list, tuple):
+        return type(a) == type(b) and len(a) == len(b) \
+            and all(_sameValue(x, y) for x, y in zip(a, b))
+    return a == b
+
 # ----------------------------- Size class -------------------------
 class Size():
     '''
@@ -1025,6 +1657,133 @@ class Size():
 
 
 
+# ----------------------------- GBitmap class -------------------------
+class GBitmap(QImage):
+    '''
+    Image of given width x height pixels to be drawn with image(x, y).
+    With NumPy the pixels are stored in a contiguous uint32 array of shape
+    (height, width) with values 0xAARRGGBB (see getArray()), which is shared
+    with the QImage without copying. So whole images can be computed with
+    NumPy expressions instead of setPixelColor() for every pixel.
+    Without NumPy it is a plain QImage (no getArray() and setRGB()).
+    The bitmap is transparent black at the beginning.
+    (For compatiblity with TigerJython.)
+    '''
+    def __init__(self, width, height):
+        if _np == None:
+            QImage.__init__(self, width, height, QImage.Format_ARGB32)
+            self.fill(0)
+            self._array = None
+            return
+        self._array = _np.zeros((height, width), _np.uint32)
+        QImage.__init__(self, sip.voidptr(self._array.ctypes.data),
+                        width, height, 4 * width, QImage.Format_ARGB32)
+
+    def getArray(self):
+        '''
+        Returns the NumPy array of shape (height, width) with the 32-bit pixel
+        values 0xAARRGGBB, row 0 is the top row. Changes of the array are
+        changes of the bitmap. (In threaded mode or while recording, change the
+        array only after the render thread has drawn the bitmap, e.g. after flush().)
+        '''
+        if self._array is None:
+            raise Exception("GBitmap.getArray() needs NumPy.")
+        return self._array
+
+    def setRGB(self, red, green, blue, alpha = 255):
+        '''
+        Sets all pixels from the given color channels (numbers or NumPy arrays
+        of shape (height, width) with values 0..255).
+        '''
+        if self._array is None:
+            raise Exception("GBitmap.setRGB() needs NumPy.")
+        a = self._array
+        a[...] = alpha
+        a <<= 8
+        a |= _np.asarray(red, _np.uint32)
+        a <<= 8
+        a |= _np.asarray(green, _np.uint32)
+        a <<= 8
+        a |= _np.asarray(blue, _np.uint32)
+
+    def setPixelColor(self, x, y, color):
+        '''
+        Sets the color of the pixel at given pixel coordinates ((0, 0) upper left corner).
+        @param color: RGB or RGBA list/tuple (e.g. from makeColor()) or X11 color string
+        '''
+        if self._array is None:
+            self.setPixel(x, y, _packRGBA(color))
+        else:
+            self._array[y, x] = _packRGBA(color)
+
+    def getPixelColor(self, x, y):
+        '''
+        Returns the RGBA color tuple of the pixel at given pixel coordinates.
+        '''
+        if self._array is None:
+            return _unpackRGBA(self.pixel(x, y))
+        return _unpackRGBA(int(self._array[y, x]))
+
+    def getWidth(self):
+        return self.width()
+
+    def getHeight(self):
+        return self.height()
+
+# ----------------------------- headless GPanel -------------------------
+def _headlessMode(kwargs):
+    # True if a GPanel with the given keyword parameters is headless
+    embedded = kwargs.get('embedded') == True
+    headless = kwargs.get('headless')
+    if headless == None:
+        headless = not embedded and os.environ.get("GPANEL_HEADLESS", "0") not in ("", "0")
+    return bool(headless)
+
+class _HeadlessWidget(object):
+    '''
+    Stands in for QWidget as base class of a headless GPanel. The size
+    methods return the size of the graphics area, all other QWidget
+    methods do nothing and return None.
+    '''
+    def width(self):
+        return self.winWidth
+
+    def height(self):
+        return self.winHeight
+
+    def size(self):
+        return QSize(self.winWidth, self.winHeight)
+
+    def rect(self):
+        return QRect(0, 0, self.winWidth, self.winHeight)
+
+    def windowTitle(self):
+        return self._title
+
+    def isVisible(self):
+        return False
+
+    def __getattr__(self, name):
+        if name.startswith("_") or not hasattr(QtGui.QWidget, name):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+_headlessClasses = {}  # GPanel class -> headless class
+
+def _headlessClass(cls):
+    # Returns a class with the methods of the given GPanel class (and of its
+    # GPanel base classes), but derived from _HeadlessWidget instead of QWidget
+    headless = _headlessClasses.get(cls)
+    if headless == None:
+        namespace = {}
+        for base in reversed(cls.__mro__[:cls.__mro__.index(QtGui.QWidget)]):
+            namespace.update(base.__dict__)
+        for name in ("__new__", "__dict__", "__weakref__"):
+            namespace.pop(name, None)
+        headless = type(cls.__name__, (_HeadlessWidget,), namespace)
+        _headlessClasses[cls] = headless
+    return headless
+
 # =====================================================================
 # ============================= GPanel class ==========================
 # =====================================================================
@@ -1086,6 +1845,15 @@ class GPanel(QtGui.QWidget):
     Python process terminates.
     '''
 
+    def __new__(cls, *args, **kwargs):
+        # a QApplication without GUI cannot create widgets, so a headless GPanel
+        # is an instance of the same class built on _HeadlessWidget
+        if _headlessMode(kwargs):
+            self = object.__new__(_headlessClass(cls))
+            self.__init__(*args, **kwargs)
+            return self
+        return super(GPanel, cls).__new__(cls)
+
     def __init__(self, *args, **kwargs):
         '''
         Constructs a GPanel and displays a non-resizable graphics window.
@@ -1100,6 +1868,18 @@ class GPanel(QtGui.QWidget):
         1 Parameter: Size(window_width, window_height)
         4 Parameters: xmin, xmax, ymin, ymax
         @param Size: a Size refererence that defines the width and height of the graphics window.
+
+        With headless = True (default: environment variable GPANEL_HEADLESS set and not "0")
+        no widget is created and all drawings are performed in a QImage only.
+        The headless GPanel is not a QWidget (see _HeadlessWidget).
+        If the environment variable GPANEL_OUTPUT is set, the headless graphics is saved
+        to this file when the Python process terminates.
+
+        With threaded = True the drawing operations are queued and performed by a
+        render thread in QImage buffers, they may be called from any thread.
+        The GUI thread renders the changes in the window with the maximum frame rate.
+        Methods returning graphics data (e.g. getPixelColor()) wait until all queued
+        operations are done, queued operations return None.
         '''
         try:
             self._embedded = kwargs['embedded']
@@ -1108,9 +1888,20 @@ class GPanel(QtGui.QWidget):
         else:
             if type(self._embedded) != bool:
                 self._embedded = False
-        if not self._embedded:
-            self._app = QtGui.QApplication(sys.argv)
-        super(GPanel, self).__init__()
+        self._headless = _headlessMode(kwargs)
+        self._threaded = bool(kwargs.get('threaded')) and not self._headless and not self._embedded
+        if self._headless:
+            self._embedded = False
+            # no GUI, a QApplication may already exist (more than one headless GPanel)
+            self._app = QApplication.instance()
+            if self._app == None:
+                self._app = QtGui.QApplication(sys.argv, False)
+            if os.environ.get("GPANEL_OUTPUT"):
+                atexit.register(self.saveImage, os.environ["GPANEL_OUTPUT"])
+        else:
+            if not self._embedded:
+                self._app = QtGui.QApplication(sys.argv)
+            super(GPanel, self).__init__()
         self.xmin = 0
         self.xmax = 1
         self.ymin = 0
@@ -1132,26 +1923,41 @@ class GPanel(QtGui.QWidget):
 
     def _initUI(self):
         self._setDefaults()
-        self._label = QLabel()
-        self._pixmap = QPixmap(QSize(self.winWidth, self.winHeight))
-        self._vbox = QVBoxLayout()
-        self._vbox.setContentsMargins(1, 1, 1, 1)
-        self.setLayout(self._vbox)
+        if self._headless:
+            # the offscreen buffer is a QImage, there is no widget at all
+            self._pixmap = QImage(self.winWidth, self.winHeight, QImage.Format_RGB32)
+            self._painter = QPainter(self._pixmap)
+            self._layers = {_BASE_LAYER: [self._pixmap, self._painter, 0]}
+            self.clear()
+            return
+        if self._threaded:
+            # the render thread may only paint into QImages, the window shows a copy
+            self._pixmap = QImage(self.winWidth, self.winHeight, QImage.Format_RGB32)
+        else:
+            self._pixmap = QPixmap(QSize(self.winWidth, self.winHeight))
         self._painter = QPainter(self._pixmap)
-        self.paintEvent(0)
+        self._layers = {_BASE_LAYER: [self._pixmap, self._painter, 0]}
+        # renders the changes that came in faster than the maximum frame rate
+        self._presentTimer = QTimer()
+        self._presentTimer.setSingleShot(True)
+        self._presentTimer.timeout.connect(self._present)
+        atexit.register(self._flushAtExit)
         self.clear()
+        if self._threaded:
+            self._startRenderThread()
+        # the size of the graphics area and the 1 pixel border, also in a parent layout
+        self.setFixedSize(self.winWidth + 2, self.winHeight + 2)
         if not self._embedded:
             self.show()
-            self.setFixedSize(self.winWidth + 2, self.winHeight + 2)
 
     def _setDefaults(self):
-        self.setWindowTitle('GPanel')
+        self.setTitle('GPanel')
         self._penSize = 1
         self._penColor = QColor(0, 0, 0)
         self._bgColor = QColor(255, 255, 255, 255)
 
         # default pos of GPanel window
-        if not self._embedded:
+        if not self._embedded and not self._headless:
             ulx = 10
             uly = 10
             super(GPanel, self).move(ulx, uly)  # position
@@ -1159,6 +1965,9 @@ class GPanel(QtGui.QWidget):
         self._xCurrent = 0
         self._yCurrent = 0
         self._enableRepaint = True
+        self._frameDepth = 0
+        self._frameCount = 0
+        self._lastFrameCount = 0
         self._adjust()
         self._onMousePressed = None
         self._onMouseReleased = None
@@ -1171,8 +1980,22 @@ class GPanel(QtGui.QWidget):
         self._closeListener = None
         self._pathHistory = None
         self._savePixmap = None
-        self._doRepaint = False
-
+        self._image = None
+        self._dirty = QRect()
+        self._pens = {}
+        self._brushes = {}
+        self._painterState = None
+        self._layer = _BASE_LAYER
+        self._composed = None
+        self._recorder = None
+        self._recordDepth = 0
+        self._maxFrameRate = 60 if self._threaded else 0  # 0: render every drawing operation
+        self._lastPresent = 0.0
+        self._renderQueue = None
+        self._renderThread = None
+        self._renderLock = threading.Lock()  # held by the render thread while drawing
+
+    @_command
     def clear(self):
         '''
         Clears the graphics window and the offscreen buffer used by the window
@@ -1180,29 +2003,40 @@ class GPanel(QtGui.QWidget):
         Sets the current graph cursor position to (0, 0).
         If enableRepaint(false) only clears the offscreen buffer.
         '''
-        self._painter.setPen(QPen(self._bgColor, 1))
-        self._painter.fillRect(QRect(0, 0, self.winWidth, self.winHeight), self._bgColor)
-        self._painter.setPen(QPen(self._penColor, self._penSize))
+        self._clearBuffer(self._painter, self._layer)
         self._xCurrent = 0
         self._yCurrent = 0
-        if self._enableRepaint:
-            self.repaint()
+        self._drawn(self._pixmap.rect())
 
+    @_command
     def erase(self):
         '''
         Same as clear(), but lets the current graph cursor unganged.
         '''
-        self._painter.setPen(QPen(self._bgColor, 1))
-        self._painter.fillRect(QRect(0, 0, self.winWidth, self.winHeight), self._bgColor)
-        self._painter.setPen(QPen(self._penColor, self._penSize))
-        if self._enableRepaint:
-            self.repaint()
+        self._clearBuffer(self._painter, self._layer)
+        self._drawn(self._pixmap.rect())
+
+    def _clearBuffer(self, painter, layer):
+        # the base layer is filled with the background color, all other layers
+        # become fully transparent
+        rect = QRect(0, 0, self.winWidth, self.winHeight)
+        if layer == _BASE_LAYER:
+            painter.fillRect(rect, self._bgColor)
+        else:
+            mode = painter.compositionMode()
+            painter.setCompositionMode(QPainter.CompositionMode_Source)
+            painter.fillRect(rect, Qt.transparent)
+            painter.setCompositionMode(mode)
 
     def keep(self):
         '''
         Blocks until the title bar's close button is hit. Then cleans up
         the graphics system.
+        Returns immediately in headless mode.
         '''
+        if self._headless:
+            return
+        self.flush()
         self._app.exec_()  # blocking
 #        self._painter.end()
 #        sys.exit(0)
@@ -1212,15 +2046,24 @@ class GPanel(QtGui.QWidget):
         Sets the title in the window title bar.
         @param title: the title text
         '''
-        self.setWindowTitle(title)
+        self._title = title
+        if not self._headless:
+            self.setWindowTitle(title)
 
     # override
     def paintEvent(self, e):
-        if self._doRepaint:
-            self._label.setPixmap(self._pixmap)
-            self._vbox.addWidget(self._label)
-            self._doRepaint = False
+        # copy the requested region from the offscreen buffer (1 pixel border)
+        source = e.rect().translated(-1, -1).intersected(self._pixmap.rect())
+        if source.isEmpty():
+            return
+        painter = QPainter(self)
+        if self._composed != None:
+            painter.drawPixmap(source.translated(1, 1), self._composed, source)
+        else:
+            painter.drawPixmap(source.translated(1, 1), self._layers[_BASE_LAYER][0], source)
+        painter.end()
 
+    @_command
     def setColor(self, *args):
         '''
         Same as setPenColor()
@@ -1231,6 +2074,9 @@ class GPanel(QtGui.QWidget):
     def _toRGBA(self, *args):
         if len(args) == 1:
             if type(args[0]) == str:
+                rgba = _rgbaCache.get(args[0])
+                if rgba != None:
+                    return rgba
                 try:
                     color = args[0].lower()
                     rgb = x11ColorDict[color]
@@ -1240,6 +2086,7 @@ class GPanel(QtGui.QWidget):
                 g = rgb[1]
                 b = rgb[2]
                 a = 255
+                _rgbaCache[args[0]] = (r, g, b, a)
             elif type(args[0]) == list or type(args[0]) == tuple:
                 if len(args[0]) == 3:
                     r = args[0][0]
@@ -1273,6 +2120,7 @@ class GPanel(QtGui.QWidget):
 
         return r, g, b, a
 
+    @_command
     def setPenColor(self, *args):
         '''
         Sets the current pen color.
@@ -1284,8 +2132,8 @@ class GPanel(QtGui.QWidget):
         '''
         r, g, b, a = self._toRGBA(*args) 
         self._penColor = QColor(r, g, b, a)
-        self._painter.setPen(QPen(self._penColor, self._penSize))
 
+    @_command
     def setPenSize(self, size):
         '''
         Sets the current pen size (width) (>=1).
@@ -1294,9 +2142,38 @@ class GPanel(QtGui.QWidget):
         '''
         oldPenSize = self._penSize
         self._penSize = size
-        self._painter.setPen(QPen(self._penColor, self._penSize))
         return oldPenSize
 
+    def _strokeMode(self, color = None):
+        # Prepares the painter for outlines with the current pen size and
+        # the given color (default: pen color). Pens are created only once.
+        if color is None:
+            color = self._penColor
+        key = (color.rgba(), self._penSize)
+        if self._painterState != (key, None):
+            pen = self._pens.get(key)
+            if pen == None:
+                pen = QPen(color, self._penSize)
+                self._pens[key] = pen
+            self._painter.setPen(pen)
+            self._painter.setBrush(Qt.NoBrush)
+            self._painterState = (key, None)
+
+    def _fillMode(self, color = None):
+        # Prepares the painter for filled shapes with the given color
+        # (default: pen color) and no outline. Brushes are created only once.
+        if color is None:
+            color = self._penColor
+        key = color.rgba()
+        if self._painterState != (None, key):
+            brush = self._brushes.get(key)
+            if brush == None:
+                brush = QBrush(color)
+                self._brushes[key] = brush
+            self._painter.setPen(Qt.NoPen)
+            self._painter.setBrush(brush)
+            self._painterState = (None, key)
+
     # coordinate transformations
     def toPixel(self, user):
         '''
@@ -1338,32 +2215,81 @@ class GPanel(QtGui.QWidget):
         '''
         Returns user x-coordinate of given pixel x-coordinate.
         '''
-        a = (self.winWidth - 1) / (self.xmax - self.xmin)
-        b = (self.winWidth - 1) * self.xmin / (self.xmin - self.xmax)
-        return (pixelX - b) / a
+        return (pixelX - self._b) / self._a
 
     def toUserY(self, pixelY):
         '''
         Returns user y-coordinate of given pixel y-coordinate.
         '''
-        c = (self.winHeight - 1)  / (self.ymin - self.ymax)
-        d = (self.winHeight - 1) * self.ymax / (self.ymax - self.ymin)
-        return (pixelY - d) / c
+        return (pixelY - self._d) / self._c
 
     def toUserWidth(self, pixelWidth):
         '''
         Returns user x-increment of given pixel x-increment (always positive).
         '''
-        a = (self.winWidth - 1) / (self.xmax - self.xmin)
-        return abs(pixelWidth / a)
+        return abs(pixelWidth / self._a)
 
     def toUserHeight(self, pixelHeight):
         '''
         Returns user y-increment of given pixel y-increment (always positive).
         '''
-        c = (self.winWidth - 1) / (self._ymin - self._ymax)
-        return abs(pixelHeight / c)
+        return abs(pixelHeight / self._c)
+
+    def toPixelArray(self, xs, ys):
+        '''
+        Returns the pixel coordinates of all given user coordinates in one pass
+        as tuple of two integer arrays (NumPy arrays if NumPy is installed,
+        otherwise array('i')).
+        @param xs: the user x-coordinates (list, tuple, array('d'), NumPy array)
+        @param ys: the corresponding user y-coordinates
+        '''
+        if len(xs) != len(ys):
+            raise ValueError("x and y list/tuple must have equal size")
+        a, b, c, d = self._a, self._b, self._c, self._d
+        if _np != None:
+            return ((a * _np.asarray(xs, float) + b).astype(int),
+                    (c * _np.asarray(ys, float) + d).astype(int))
+        return (array('i', [int(a * x + b) for x in xs]),
+                array('i', [int(c * y + d) for y in ys]))
+
+    def toUserArray(self, xs, ys):
+        '''
+        Returns the user coordinates of all given pixel coordinates in one pass
+        as tuple of two float arrays (NumPy arrays if NumPy is installed,
+        otherwise array('d')).
+        @param xs: the pixel x-coordinates (list, tuple, array, NumPy array)
+        @param ys: the corresponding pixel y-coordinates
+        '''
+        if len(xs) != len(ys):
+            raise ValueError("x and y list/tuple must have equal size")
+        a, b, c, d = self._a, self._b, self._c, self._d
+        if _np != None:
+            return ((_np.asarray(xs, float) - b) / a,
+                    (_np.asarray(ys, float) - d) / c)
+        return (array('d', [(x - b) / a for x in xs]),
+                array('d', [(y - d) / c for y in ys]))
+
+    def _toPolygon(self, args):
+        # QPolygonF in pixel coordinates of the vertexes given as
+        # list of [x, y] (1 parameter) or as lists x, y (2 parameters)
+        if len(args) == 1:
+            if _np != None and isinstance(args[0], _np.ndarray):
+                xs = args[0][:, 0]
+                ys = args[0][:, 1]
+            else:
+                xs = [pt[0] for pt in args[0]]
+                ys = [pt[1] for pt in args[0]]
+        elif len(args) == 2:
+            if len(args[0]) != len(args[1]):
+               raise ValueError("x and y list/tuple must have equal size")
+            xs = args[0]
+            ys = args[1]
+        else:
+            raise ValueError("Illegal number of parameters.")
+        xPix, yPix = self.toPixelArray(xs, ys)
+        return QPolygonF([QPointF(x, y) for x, y in zip(xPix.tolist(), yPix.tolist())])
 
+    @_command
     def setUserCoords(self, xmin, xmax, ymin, ymax):
         '''
         Sets user coordinate system left_x, right_x, bottom_y, top_y (inclusive).
@@ -1389,11 +2315,135 @@ class GPanel(QtGui.QWidget):
     def repaint(self):
         '''
         Renders the offscreen buffer in the graphics window.
+        The window is rendered at most with the maximum frame rate (see setMaxFrameRate()),
+        if called earlier, the changes are rendered by a timer as soon as the time has come.
+        (Nothing to do in headless mode.)
+        '''
+        if self._headless:
+            self._dirty = QRect()
+            return
+        if self._threaded:
+            return  # rendered by the frame timer of the GUI thread
+        if self._maxFrameRate > 0:
+            wait = self._lastPresent + 1.0 / self._maxFrameRate - _clock()
+            if wait > 0:
+                if not self._presentTimer.isActive():
+                    self._presentTimer.start(int(wait * 1000) + 1)
+                return
+        self._present()
+        QApplication.processEvents()
+
+    def flush(self):
+        '''
+        Renders all changes in the graphics window at once (regardless of the maximum frame rate).
         '''
-        self._doRepaint = True
-        self.update()
+        if self._headless:
+            self._dirty = QRect()
+            return
+        if self._threaded:
+            self._sync()
+            if threading.current_thread() is self._guiThread:
+                self._presentFrame(True)
+                QApplication.processEvents()
+            return
+        self._presentTimer.stop()
+        self._present()
         QApplication.processEvents()
 
+    def _flushAtExit(self):
+        # renders the changes still waiting for the frame timer when the program ends
+        # without keep(). A window that is closed already is gone (RuntimeError).
+        try:
+            if not self._dirty.isEmpty() and self.isVisible():
+                self.flush()
+        except RuntimeError:
+            pass
+
+    def _present(self):
+        # only the changed region of the window is rendered (1 pixel border)
+        if not self._dirty.isEmpty():
+            if self._composed != None:
+                self._compose(self._composed, self._dirty)
+            self.update(self._dirty.translated(1, 1))
+            self._dirty = QRect()
+        self._lastPresent = _clock()
+
+    def setMaxFrameRate(self, fps):
+        '''
+        Sets the maximum number of times per second the graphics window is rendered
+        (default: 0, every drawing operation is rendered at once; 60 in threaded mode).
+        Drawing operations are not slowed down, they are rendered together with the
+        next frame, which is rendered by a timer of the Qt event loop, so with a
+        maximum frame rate call flush() (or delay()) before time.sleep().
+        @param fps: frames per second, 0 to render after every drawing operation
+        '''
+        self._maxFrameRate = fps
+        if self._threaded:
+            self._frameTimer.setInterval(self._frameInterval())
+
+    # ------------- render thread (threaded mode) -------------
+    def _startRenderThread(self):
+        # the window shows the composite of the layers, copied by the GUI thread
+        # from the buffers of the render thread every frame
+        self._composed = QPixmap(QSize(self.winWidth, self.winHeight))
+        self._compose(self._composed, self._composed.rect())
+        self._dirty = self._composed.rect()
+        self._guiThread = threading.current_thread()
+        self._renderQueue = queue.Queue(10000)
+        self._renderThread = threading.Thread(target = self._render, name = "GPanel render")
+        self._renderThread.daemon = True
+        self._renderThread.start()
+        self._frameTimer = QTimer()
+        self._frameTimer.timeout.connect(self._presentFrame)
+        self._frameTimer.start(self._frameInterval())
+
+    def _frameInterval(self):
+        # milliseconds between two frames
+        if self._maxFrameRate > 0:
+            return max(1, int(1000 / self._maxFrameRate))
+        return 1
+
+    def _enqueue(self, name, args):
+        # puts a drawing operation into the queue of the render thread. A busy
+        # GUI thread renders the finished drawings when a frame is due.
+        self._renderQueue.put((name, args))
+        if threading.current_thread() is self._guiThread \
+                and _clock() - self._lastPresent > self._frameInterval() / 1000.0:
+            self._lastPresent = _clock()
+            self._presentFrame()
+            QApplication.processEvents()
+        return None
+
+    def _render(self):
+        # render thread: performs the queued operations
+        while True:
+            name, args = self._renderQueue.get()
+            try:
+                with self._renderLock:
+                    getattr(self, name)(*args)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self._renderQueue.task_done()
+
+    def _presentFrame(self, force = False):
+        # GUI thread: copies the changed region of the render buffers into the window buffer.
+        # While the render thread is inside beginFrame()/endFrame() only flush() presents.
+        with self._renderLock:
+            dirty = self._dirty
+            if dirty.isEmpty() or (self._frameDepth > 0 and not force):
+                return
+            self._compose(self._composed, dirty)
+            self._dirty = QRect()
+        self._lastPresent = _clock()
+        self.update(dirty.translated(1, 1))
+
+    def _sync(self):
+        # waits until the render thread has performed all queued operations
+        if self._renderQueue is not None and threading.current_thread() is not self._renderThread:
+            self._renderQueue.join()
+
+    @_queued
     def enableRepaint(self, enable):
         '''
         Enables/Disables automatic repaint in graphics drawing methods.
@@ -1401,6 +2451,184 @@ class GPanel(QtGui.QWidget):
         '''
         self._enableRepaint = enable
 
+    @_queued
+    def beginFrame(self):
+        '''
+        Starts a frame. Until the matching endFrame(), all drawing operations
+        are only performed in the offscreen buffer and the graphics window
+        is rendered once when the frame ends. Frames may be nested, only the
+        outermost endFrame() renders.
+        '''
+        if self._frameDepth == 0:
+            self._frameCount = 0
+        self._frameDepth += 1
+
+    @_queued
+    def endFrame(self):
+        '''
+        Ends a frame started with beginFrame() and renders the offscreen buffer
+        in the graphics window (if automatic repaint is enabled).
+        Returns the number of drawing operations coalesced in the frame.
+        '''
+        if self._frameDepth == 0:
+            raise Exception("Must call beginFrame() before endFrame()")
+        self._frameDepth -= 1
+        if self._frameDepth == 0:
+            self._lastFrameCount = self._frameCount
+            if self._enableRepaint:
+                self.repaint()
+        return self._frameCount
+
+    def getFrameCount(self):
+        '''
+        Returns the number of drawing operations coalesced in the current frame
+        or, if no frame is active, in the last frame.
+        '''
+        if self._frameDepth > 0:
+            return self._frameCount
+        return self._lastFrameCount
+
+    def startRecording(self):
+        '''
+        Starts recording the drawing commands (and the changes of pen, user coordinates
+        and layers) in a new display list, which starts with the current user coordinates,
+        background color (so the replay clears the current layer), layers, current layer,
+        pen color, pen size, paint mode and graph cursor position. The graphics already
+        drawn is not recorded. Returns the DisplayList.
+        Only one recording at a time, stop it with stopRecording().
+        '''
+        # in threaded mode the recording starts after the queued operations,
+        # the render thread records the operations queued from now on
+        self._sync()
+        if self._recorder is not None:
+            raise Exception("Already recording, call stopRecording() first.")
+        recorder = DisplayList()
+        recorder.add("setUserCoords", (self.xmin, self.xmax, self.ymin, self.ymax))
+        recorder.add("setBgColor", (tuple(self._bgColor.getRgb()),))
+        for name, layer in sorted(self._layers.items(), key = lambda item: item[1][2]):
+            if name != _BASE_LAYER:
+                recorder.add("addLayer", (name, layer[2]))
+        recorder.add("setLayer", (self._layer,))
+        recorder.add("setPenColor", (tuple(self._penColor.getRgb()),))
+        recorder.add("setPenSize", (self._penSize,))
+        if self._painter.compositionMode() == QPainter.RasterOp_SourceXorDestination:
+            recorder.add("setXORMode", ())
+        recorder.add("pos", (self._xCurrent, self._yCurrent))
+        self._recorder = recorder
+        return recorder
+
+    def stopRecording(self):
+        '''
+        Stops recording and returns the DisplayList (None if not recording).
+        '''
+        self._sync()
+        recorder = self._recorder
+        self._recorder = None
+        return recorder
+
+    @_command
+    def addLayer(self, name, z = None):
+        '''
+        Adds a new transparent layer. The layers are composited in the order of
+        their z values when the window is rendered, the base layer "base" with
+        the background color has z = 0. A layer keeps its graphics until it is
+        drawn into or cleared, so static graphics in its own layer is never drawn again.
+        @param name: the name of the layer
+        @param z: the stacking order (default: above all other layers)
+        '''
+        if name in self._layers:
+            raise ValueError("Layer " + str(name) + " already exists.")
+        if z == None:
+            z = max(layer[2] for layer in self._layers.values()) + 1
+        buffer = QImage(self.winWidth, self.winHeight, QImage.Format_ARGB32)
+        painter = QPainter(buffer)
+        self._clearBuffer(painter, name)
+        self._layers[name] = [buffer, painter, z]
+        if self._composed == None and not self._headless:
+            # from now on the window shows the composite of the layers
+            self._composed = QPixmap(QSize(self.winWidth, self.winHeight))
+            self._dirty = self._dirty.united(buffer.rect())
+
+    @_command
+    def removeLayer(self, name):
+        '''
+        Removes the layer with the given name (not the base layer).
+        If it is the current layer, the base layer becomes the current layer.
+        @param name: the name of the layer
+        '''
+        if name == _BASE_LAYER:
+            raise ValueError("The base layer cannot be removed.")
+        layer = self._getLayer(name)
+        if name == self._layer:
+            self.setLayer(_BASE_LAYER)
+        layer[1].end()
+        del self._layers[name]
+        if len(self._layers) == 1 and not self._threaded:
+            self._composed = None
+        self._drawn(layer[0].rect())
+
+    @_command
+    def setLayer(self, name):
+        '''
+        Selects the layer all following drawing operations (and getPixelColor(), fill())
+        are performed in.
+        @param name: the name of the layer ("base" for the base layer)
+        '''
+        layer = self._getLayer(name)
+        self._pixmap = layer[0]
+        self._painter = layer[1]
+        self._layer = name
+        self._painterState = None
+        self._image = None
+
+    def getLayer(self):
+        '''
+        Returns the name of the current layer.
+        '''
+        return self._layer
+
+    @_command
+    def clearLayer(self, name = None):
+        '''
+        Clears the given layer (default: the current layer). The base layer
+        is painted with the background color, other layers become transparent.
+        The graph cursor position is not changed.
+        @param name: the name of the layer
+        '''
+        if name == None:
+            name = self._layer
+        layer = self._getLayer(name)
+        self._clearBuffer(layer[1], name)
+        self._drawn(layer[0].rect())
+
+    def _getLayer(self, name):
+        layer = self._layers.get(name)
+        if layer == None:
+            raise ValueError("Layer " + str(name) + " not found.")
+        return layer
+
+    def _compose(self, target, rect):
+        # paints the given region of all layers in z order into the target (QPixmap or QImage)
+        painter = QPainter(target)
+        painter.fillRect(rect, self._bgColor)
+        for buffer, layerPainter, z in sorted(self._layers.values(), key = lambda layer: layer[2]):
+            if isinstance(buffer, QImage):
+                painter.drawImage(rect.topLeft(), buffer, rect)
+            else:
+                painter.drawPixmap(rect.topLeft(), buffer, rect)
+        painter.end()
+
+    def _drawn(self, rect):
+        # called by every drawing operation after painting into the offscreen buffer,
+        # rect is the changed region (pixel coordinates)
+        self._image = None
+        self._dirty = self._dirty.united(rect)
+        if self._frameDepth > 0:
+            self._frameCount += 1
+        elif self._enableRepaint:
+            self.repaint()
+
+    @_command
     def line(self, x1, y1, x2, y2):
         '''
         Draws a line with given user start and end coordinates
@@ -1413,12 +2641,13 @@ class GPanel(QtGui.QWidget):
         yStart = self.toPixelY(y1)
         xEnd = self.toPixelX(x2)
         yEnd = self.toPixelY(y2)
+        self._strokeMode()
         self._painter.drawLine(xStart, yStart, xEnd, yEnd)
         self._xCurrent = x2
         self._yCurrent = y2
-        if self._enableRepaint:
-            self.repaint()
+        self._drawn(self._bounds([xStart, xEnd], [yStart, yEnd]))
 
+    @_command
     def pos(self, x, y):
         '''
         Sets the current graph cursor position to given user coordinates.
@@ -1430,6 +2659,7 @@ class GPanel(QtGui.QWidget):
         self._xCurrent = x
         self._yCurrent = y
 
+    @_command
     def move(self, x, y):
         # Overrides super.move()
         '''
@@ -1441,6 +2671,7 @@ class GPanel(QtGui.QWidget):
         '''
         self.pos(x, y)
 
+    @_command
     def draw(self, x, y):
         '''
         Draws a line form current graph cursor position to (x, y).
@@ -1453,6 +2684,7 @@ class GPanel(QtGui.QWidget):
         if self._pathHistory != None:
             self._pathHistory.append([x, y])
 
+    @_command
     def linePlot(self, *args):
         '''
         Draws a line plot with given x,y data.
@@ -1460,48 +2692,35 @@ class GPanel(QtGui.QWidget):
         2 parameters: two lists/tuples x, y of corresponding x-y pairs
         The graph cursor position remains unchanged.
         '''
-        nodes = []
-        if len(args) == 1:
-            for pt in args[0]:
-                node = [pt[0], pt[1]]
-                nodes.append(node)
-        elif len(args) == 2:
-            if len(args[0]) != len(args[1]):
-               raise ValueError("x and y list/tuple must have equal size")
-            for i in range(len(args[0])):
-                node = [args[0][i], args[1][i]]
-                nodes.append(node)
-        else:
-            raise ValueError("Illegal number of parameters.")
-
-        for i in range(len(nodes) - 1):
-            x1 = self.toPixelX(nodes[i][0])
-            y1 = self.toPixelY(nodes[i][1])
-            x2 = self.toPixelX(nodes[i + 1][0])
-            y2 = self.toPixelY(nodes[i + 1][1])
-            self._painter.drawLine(x1, y1, x2, y2)
-
-        if self._enableRepaint:
-            self.repaint()
+        p = self._toPolygon(args)
+        if p.size() < 2:
+            return
+        self._strokeMode()
+        self._painter.drawPolyline(p)
+        self._drawn(self._polygonBounds(p))
 
-    def getPos():
+    def getPos(self):
         '''
         Returns a tuple with current graph cursor position (tuple, user coordinates).
         '''
+        self._sync()
         return self._xCurrent, self._yCurrent
 
     def getPosX(self):
         '''
         Returns the current graph cursor x-position (user coordinates).
         '''
+        self._sync()
         return self._xCurrent
 
     def getPosY(self):
         '''
         Returns the current graph cursor y-position (user coordinates).
         '''
+        self._sync()
         return self._yCurrent
 
+    @_command
     def text(self, *args):
         '''
         Draws a text at given position (user coordinates).
@@ -1523,9 +2742,9 @@ class GPanel(QtGui.QWidget):
         else:
             raise ValueError("Illegal number of arguments")
 
+        self._strokeMode()
         self._painter.drawText(xPos, yPos, text)
-        if self._enableRepaint:
-            self.repaint()
+        self._drawn(self._painter.fontMetrics().boundingRect(text).translated(xPos, yPos).adjusted(-1, -1, 1, 1))
 
     def addCloseListener(self, closeListener):
         '''
@@ -1545,6 +2764,7 @@ class GPanel(QtGui.QWidget):
             e.ignore()
             self._closeListener()
 
+    @_command
     def setBgColor(self, *args):
         '''
         Sets the background color. All drawings are erased and the current
@@ -1561,6 +2781,7 @@ class GPanel(QtGui.QWidget):
         self.clear()
 
 
+    @_command
     def circle(self, radius):
         '''
         Draws a circle with center at the current graph cursor position
@@ -1570,10 +2791,11 @@ class GPanel(QtGui.QWidget):
         xPix = self.toPixelX(self._xCurrent)
         yPix = self.toPixelY(self._yCurrent)
         rPix = self.toPixelWidth(radius)
+        self._strokeMode()
         self._painter.drawEllipse(QPointF(xPix, yPix), rPix, rPix)
-        if self._enableRepaint:
-            self.repaint()
+        self._drawn(self._bounds([xPix - rPix, xPix + rPix], [yPix - rPix, yPix + rPix]))
 
+    @_command
     def fillCircle(self, radius):
         '''
         Draws a filled circle with center at the current graph cursor position
@@ -1583,15 +2805,12 @@ class GPanel(QtGui.QWidget):
         xPix = self.toPixelX(self._xCurrent)
         yPix = self.toPixelY(self._yCurrent)
         rPix = self.toPixelWidth(radius)
-        self._painter.setPen(Qt.NoPen)
-        self._painter.setBrush(QBrush(self._penColor))
+        self._fillMode()
         self._painter.drawEllipse(QPointF(xPix, yPix), rPix, rPix)
-        if self._enableRepaint:
-            self.repaint()
-        self._painter.setPen(QPen(self._penColor, self._penSize))
-        self._painter.setBrush(Qt.NoBrush)
+        self._drawn(self._bounds([xPix - rPix, xPix + rPix], [yPix - rPix, yPix + rPix]))
 
 
+    @_command
     def ellipse(self, a, b):
         '''
         Draws an ellipse with center at the current graph cursor position
@@ -1603,10 +2822,11 @@ class GPanel(QtGui.QWidget):
         yPix = self.toPixelY(self._yCurrent)
         aPix = self.toPixelWidth(a)
         bPix = self.toPixelHeight(b)
+        self._strokeMode()
         self._painter.drawEllipse(QPointF(xPix, yPix), aPix, bPix)
-        if self._enableRepaint:
-            self.repaint()
+        self._drawn(self._bounds([xPix - aPix, xPix + aPix], [yPix - bPix, yPix + bPix]))
 
+    @_command
     def fillEllipse(self, a, b):
         '''
         Draws a filled ellipse with center at the current graph cursor position
@@ -1618,14 +2838,11 @@ class GPanel(QtGui.QWidget):
         yPix = self.toPixelY(self._yCurrent)
         aPix = self.toPixelWidth(a)
         bPix = self.toPixelHeight(b)
-        self._painter.setPen(Qt.NoPen)
-        self._painter.setBrush(QBrush(self._penColor))
+        self._fillMode()
         self._painter.drawEllipse(QPointF(xPix, yPix), aPix, bPix)
-        if self._enableRepaint:
-            self.repaint()
-        self._painter.setPen(QPen(self._penColor, self._penSize))
-        self._painter.setBrush(Qt.NoBrush)
+        self._drawn(self._bounds([xPix - aPix, xPix + aPix], [yPix - bPix, yPix + bPix]))
 
+    @_command
     def rectangle(self, *args):
         '''
         Draws a rectangle.
@@ -1643,10 +2860,11 @@ class GPanel(QtGui.QWidget):
             hPix = self.toPixelHeight(args[3] - args[1])
             ulx = self.toPixelX(args[0])
             uly = self.toPixelY(args[1])
+        self._strokeMode()
         self._painter.drawRect(ulx, uly, wPix, hPix)
-        if self._enableRepaint:
-            self.repaint()
+        self._drawn(self._bounds([ulx, ulx + wPix], [uly, uly + hPix]))
 
+    @_command
     def fillRectangle(self, *args):
         '''
         Draws a filled rectangle (fill color = pen color).
@@ -1664,14 +2882,11 @@ class GPanel(QtGui.QWidget):
             hPix = self.toPixelHeight(args[3] - args[1])
             ulx = self.toPixelX(args[0])
             uly = self.toPixelY(args[1])
-        self._painter.setPen(Qt.NoPen)
-        self._painter.setBrush(QBrush(self._penColor))
+        self._fillMode()
         self._painter.drawRect(ulx, uly, wPix, hPix)
-        if self._enableRepaint:
-            self.repaint()
-        self._painter.setPen(QPen(self._penColor, self._penSize))
-        self._painter.setBrush(Qt.NoBrush)
+        self._drawn(self._bounds([ulx, ulx + wPix], [uly, uly + hPix]))
 
+    @_command
     def polygon(self, *args):
         '''
         Draws a polygon with given list of vertexes (list of [x, y] or (x, y))
@@ -1679,24 +2894,12 @@ class GPanel(QtGui.QWidget):
         1 parameter: a list/tuple of the corners [x, y] or (x, y)
         2 parameters: two lists/tuples x, y of corresponding x-y pairs
         '''
-        nodes = []
-        if len(args) == 1:
-            for pt in args[0]:
-                node = QPointF(self.toPixelX(pt[0]), self.toPixelY(pt[1]))
-                nodes.append(node)
-        elif len(args) == 2:
-            if len(args[0]) != len(args[1]):
-               raise ValueError("x and y list/tuple must have equal size")
-            for i in range(len(args[0])):
-                node = QPointF(self.toPixelX(args[0][i]), self.toPixelY(args[1][i]))
-                nodes.append(node)
-        else:
-            raise ValueError("Illegal number of parameters.")
-        p = QPolygonF(nodes)
+        p = self._toPolygon(args)
+        self._strokeMode()
         self._painter.drawPolygon(p)
-        if self._enableRepaint:
-            self.repaint()
+        self._drawn(self._polygonBounds(p))
 
+    @_command
     def fillPolygon(self, *args):
         '''
         Draws a filled polygon with given list of vertexes (list of [x, y] or (x, y))
@@ -1704,28 +2907,12 @@ class GPanel(QtGui.QWidget):
         1 parameter: a list/tuple of the corners [x, y] or (x, y)
         2 parameters: two lists/tuples x, y of corresponding x-y pairs
         '''
-        nodes = []
-        if len(args) == 1:
-            for pt in args[0]:
-                node = QPointF(self.toPixelX(pt[0]), self.toPixelY(pt[1]))
-                nodes.append(node)
-        elif len(args) == 2:
-            if len(args[0]) != len(args[1]):
-               raise ValueError("x and y list/tuple must have equal size")
-            for i in range(len(args[0])):
-                node = QPointF(self.toPixelX(args[0][i]), self.toPixelY(args[1][i]))
-                nodes.append(node)
-        else:
-            raise ValueError("Illegal number of parameters.")
-        p = QPolygonF(nodes)
-        self._painter.setPen(Qt.NoPen)
-        self._painter.setBrush(QBrush(self._penColor))
+        p = self._toPolygon(args)
+        self._fillMode()
         self._painter.drawPolygon(p)
-        if self._enableRepaint:
-            self.repaint()
-        self._painter.setPen(QPen(self._penColor, self._penSize))
-        self._painter.setBrush(Qt.NoBrush)
+        self._drawn(self._polygonBounds(p))
 
+    @_command
     def triangle(self, *args):
         '''
         Draws a triangle with given corners.
@@ -1741,6 +2928,7 @@ class GPanel(QtGui.QWidget):
         else:
             raise ValueError("Illegal number of parameters.")
 
+    @_command
     def fillTriangle(self, *args):
         '''
         Draws a filled triangle with given corners.
@@ -1756,6 +2944,7 @@ class GPanel(QtGui.QWidget):
         else:
             raise ValueError("Illegal number of parameters.")
 
+    @_command
     def arc(self, r, startAngle, spanAngle):
         '''
         Draws a circle sector with center at the current graph cursor position,
@@ -1770,10 +2959,11 @@ class GPanel(QtGui.QWidget):
         topLeft = QPoint(xPix - rPix, yPix - rPix)
         bottomRight = QPoint(xPix + rPix, yPix + rPix)
         rect = QRect(topLeft, bottomRight)
+        self._strokeMode()
         self._painter.drawArc(rect, int(16 * startAngle), int(16 * spanAngle))
-        if self._enableRepaint:
-            self.repaint()
+        self._drawn(self._bounds([rect.left(), rect.right()], [rect.top(), rect.bottom()]))
 
+    @_command
     def fillArc(self, r, startAngle, spanAngle):
         '''
         Draws a filled circle sector with center at the current graph cursor position,
@@ -1788,8 +2978,7 @@ class GPanel(QtGui.QWidget):
         topLeft = QPoint(xPix - rPix, yPix - rPix)
         bottomRight = QPoint(xPix + rPix, yPix + rPix)
         rect = QRect(topLeft, bottomRight)
-        self._painter.setPen(Qt.NoPen)
-        self._painter.setBrush(QBrush(self._penColor))
+        self._fillMode()
         self._painter.drawChord(rect, int(16 * startAngle), int(16 * spanAngle))
 
         # Draw sector triangle
@@ -1805,11 +2994,9 @@ class GPanel(QtGui.QWidget):
         p = QPolygonF(nodes)
         self._painter.drawPolygon(p)
 
-        if self._enableRepaint:
-            self.repaint()
-        self._painter.setPen(QPen(self._penColor, self._penSize))
-        self._painter.setBrush(Qt.NoBrush)
+        self._drawn(self._bounds([rect.left(), rect.right()], [rect.top(), rect.bottom()]))
 
+    @_command
     def chord(self, r, startAngle, spanAngle):
         '''
         Draws a circle chord with center at the current graph cursor position,
@@ -1825,10 +3012,11 @@ class GPanel(QtGui.QWidget):
         topLeft = QPoint(xPix - rPix, yPix - rPix)
         bottomRight = QPoint(xPix + rPix, yPix + rPix)
         rect = QRect(topLeft, bottomRight)
+        self._strokeMode()
         self._painter.drawChord(rect, int(16 * startAngle), int(16 * spanAngle))
-        if self._enableRepaint:
-            self.repaint()
+        self._drawn(self._bounds([rect.left(), rect.right()], [rect.top(), rect.bottom()]))
 
+    @_command
     def fillChord(self, r, startAngle, spanAngle):
         '''
         Draws a filled circle chord with center at the current graph cursor position,
@@ -1844,14 +3032,11 @@ class GPanel(QtGui.QWidget):
         topLeft = QPoint(xPix - rPix, yPix - rPix)
         bottomRight = QPoint(xPix + rPix, yPix + rPix)
         rect = QRect(topLeft, bottomRight)
-        self._painter.setPen(Qt.NoPen)
-        self._painter.setBrush(QBrush(self._penColor))
+        self._fillMode()
         self._painter.drawChord(rect, int(16 * startAngle), int(16 * spanAngle))
-        if self._enableRepaint:
-            self.repaint()
-        self._painter.setPen(QPen(self._penColor, self._penSize))
-        self._painter.setBrush(Qt.NoBrush)
+        self._drawn(self._bounds([rect.left(), rect.right()], [rect.top(), rect.bottom()]))
 
+    @_command
     def startPath(self):
         '''
         Starts recording the path vertexes. The positions of subsequent draw() operations are saved.
@@ -1859,6 +3044,7 @@ class GPanel(QtGui.QWidget):
         '''
         self._pathHistory = [[self._xCurrent, self._yCurrent]]
 
+    @_command
     def fillPath(self, color):
         '''
         Closes the path started with startPath() and shows a filled polygon from the saved
@@ -1871,10 +3057,12 @@ class GPanel(QtGui.QWidget):
         self.setPenColor(color)
         self.setPenSize(1)
         self.fillPolygon(self._pathHistory)
-        self._painter.setPen(QPen(oldColor, oldSize))
+        self._penColor = oldColor
+        self._penSize = oldSize
         self.polygon(self._pathHistory) # draw outline again
         self._pathHistory = None
 
+    @_command
     def showImage(self, *args):
         '''
         Draws the picture with given file path or given image at given upper-left coordinates.
@@ -1888,9 +3076,9 @@ class GPanel(QtGui.QWidget):
         xPix = self.toPixelX(args[1])
         yPix = self.toPixelY(args[2]) - img.height() + 1 # 1 pixel border
         self._painter.drawImage(xPix, yPix, img)
-        if self._enableRepaint:
-            self.repaint()
+        self._drawn(QRect(xPix, yPix, img.width(), img.height()))
 
+    @_command
     def point(self, *args):
         '''
         Draws a single point with current pen size and pen color at given user coordinates.
@@ -1911,15 +3099,135 @@ class GPanel(QtGui.QWidget):
             yPix = self.toPixelY(args[1])
         else:
             raise ValueError("Illegal number of arguments")
+        self._strokeMode()
         self._painter.drawPoint(QPointF(xPix, yPix))
-        if self._enableRepaint:
-            self.repaint()
+        self._drawn(self._bounds([xPix], [yPix]))
+
+    @_command
+    def lines(self, segments, colors = None):
+        '''
+        Draws many lines in one operation (with one repaint).
+        The lines are drawn grouped by color.
+        @param segments: list of [x1, y1, x2, y2] or [pt1, pt2] (or NumPy array of shape (n, 4))
+        @param colors: None for the current pen color, one color or a list with a color for each line
+        '''
+        x1, y1, x2, y2 = _columns(segments, 4)
+        if len(x1) == 0:
+            return
+        xStart, yStart = self.toPixelArray(x1, y1)
+        xEnd, yEnd = self.toPixelArray(x2, y2)
+        xs = xStart.tolist() + xEnd.tolist()
+        ys = yStart.tolist() + yEnd.tolist()
+        n = len(x1)
+        lines = [QLine(xs[i], ys[i], xs[n + i], ys[n + i]) for i in range(n)]
+        for color, indices in self._colorGroups(colors, n):
+            self._strokeMode(color)
+            self._painter.drawLines([lines[i] for i in indices])
+        self._drawn(self._bounds(xs, ys))
+
+    @_command
+    def fillCircles(self, centers, radii, colors = None):
+        '''
+        Draws many filled circles in one operation (with one repaint).
+        The circles are drawn grouped by color.
+        @param centers: list of centers [x, y] (or NumPy array of shape (n, 2))
+        @param radii: one radius for all circles or a list with a radius for each circle
+        @param colors: None for the current pen color, one color or a list with a color for each circle
+        '''
+        x, y = _columns(centers, 2)
+        if len(x) == 0:
+            return
+        xPix, yPix = self.toPixelArray(x, y)
+        xPix = xPix.tolist()
+        yPix = yPix.tolist()
+        n = len(xPix)
+        if isinstance(radii, numbers.Real):  # also NumPy scalars
+            rPix = [self.toPixelWidth(radii)] * n
+        else:
+            if len(radii) != n:
+                raise ValueError("radii list must have one radius for each circle")
+            rPix = [self.toPixelWidth(r) for r in radii]
+        for color, indices in self._colorGroups(colors, n):
+            self._fillMode(color)
+            for i in indices:
+                self._painter.drawEllipse(QPointF(xPix[i], yPix[i]), rPix[i], rPix[i])
+        r = max(rPix)
+        self._drawn(self._bounds([min(xPix) - r, max(xPix) + r], [min(yPix) - r, max(yPix) + r]))
+
+    @_command
+    def rectangles(self, rects, colors = None):
+        '''
+        Draws many rectangles in one operation (with one repaint).
+        The rectangles are drawn grouped by color.
+        @param rects: list of diagonals [x1, y1, x2, y2] or [pt1, pt2] (or NumPy array of shape (n, 4))
+        @param colors: None for the current pen color, one color or a list with a color for each rectangle
+        '''
+        x1, y1, x2, y2 = _columns(rects, 4)
+        if len(x1) == 0:
+            return
+        ulx, uly = self.toPixelArray(x1, y1)
+        ulx = ulx.tolist()
+        uly = uly.tolist()
+        n = len(ulx)
+        wPix = [self.toPixelWidth(x2[i] - x1[i]) for i in range(n)]
+        hPix = [self.toPixelHeight(y2[i] - y1[i]) for i in range(n)]
+        rects = [QRect(ulx[i], uly[i], wPix[i], hPix[i]) for i in range(n)]
+        for color, indices in self._colorGroups(colors, n):
+            self._strokeMode(color)
+            self._painter.drawRects([rects[i] for i in indices])
+        self._drawn(self._bounds([min(ulx), max(ulx[i] + wPix[i] for i in range(n))],
+                                 [min(uly), max(uly[i] + hPix[i] for i in range(n))]))
+
+    @_command
+    def points(self, xy, colors = None):
+        '''
+        Draws many points with current pen size in one operation (with one repaint).
+        The points are drawn grouped by color.
+        @param xy: list of points [x, y] (or NumPy array of shape (n, 2))
+        @param colors: None for the current pen color, one color or a list with a color for each point
+        '''
+        x, y = _columns(xy, 2)
+        if len(x) == 0:
+            return
+        xPix, yPix = self.toPixelArray(x, y)
+        xPix = xPix.tolist()
+        yPix = yPix.tolist()
+        for color, indices in self._colorGroups(colors, len(xPix)):
+            self._strokeMode(color)
+            self._painter.drawPoints(QPolygonF([QPointF(xPix[i], yPix[i]) for i in indices]))
+        self._drawn(self._bounds(xPix, yPix))
+
+    def _colorGroups(self, colors, n):
+        # Returns a list of (QColor, indices) of the n items
+        # for colors = None, one color or a list of n colors
+        if colors is None:
+            return [(self._penColor, range(n))]
+        if type(colors) == str or (len(colors) in (3, 4) and not isinstance(colors[0], (str, list, tuple))
+                                   and not (_np is not None and isinstance(colors[0], _np.ndarray))):
+            if type(colors) != str:
+                colors = tuple([int(v) for v in colors])
+            return [(QColor(*self._toRGBA(colors)), range(n))]
+        if len(colors) != n:
+            raise ValueError("colors list must have one color for each item")
+        groups = {}
+        keys = []
+        for i in range(n):
+            color = colors[i]
+            if type(color) != str:
+                color = tuple([int(v) for v in color])
+            key = self._toRGBA(color)
+            if key not in groups:
+                groups[key] = []
+                keys.append(key)
+            groups[key].append(i)
+        return [(QColor(*key), groups[key]) for key in keys]
 
     def getPixelColor(self, *args):
         '''
         Returns the RGBA color tuple of a pixel with given user coordinates.
         No params: Returns color at current graph cursor position.
         '''
+        self._sync()
         if len(args) == 0:
             xPix = self.toPixelX(self._xCurrent)
             yPix = self.toPixelY(self._yCurrent)
@@ -1928,26 +3236,55 @@ class GPanel(QtGui.QWidget):
             yPix = self.toPixelY(args[1])
         else:
             raise ValueError("Illegal number of parameters.")
-        img = self._pixmap.toImage()
-        c = img.pixel(xPix, yPix)
-        return QColor(c).getRgb()  # RGBA
+        c = self._getImage().pixel(xPix, yPix)
+        return _unpackRGBA(c)
+
+    def getPixelColors(self, xs, ys):
+        '''
+        Returns the RGBA colors of the pixels with given user coordinates
+        as a list of RGBA tuples. If NumPy arrays are given, a NumPy array
+        of shape (n, 4) is returned.
+        @param xs: the x coordinates (list, tuple, array)
+        @param ys: the corresponding y coordinates (list, tuple, array)
+        '''
+        if len(xs) != len(ys):
+            raise ValueError("x and y list/tuple must have equal size")
+        img = self._getImage()
+        width = img.width()
+        height = img.height()
+        view = _rasterView(img)
+        if _np == None:
+            colors = []
+            for i in range(len(xs)):
+                xPix = self.toPixelX(xs[i])
+                yPix = self.toPixelY(ys[i])
+                if not (0 <= xPix < width and 0 <= yPix < height):
+                    raise ValueError("Pixel coordinates out of range.")
+                colors.append(_unpackRGBA(view[yPix * width + xPix]))
+            return colors
+
+        xPix, yPix = self.toPixelArray(xs, ys)
+        if ((xPix < 0) | (xPix >= width) | (yPix < 0) | (yPix >= height)).any():
+            raise ValueError("Pixel coordinates out of range.")
+        pixels = _np.asarray(view)[yPix * width + xPix]
+        colors = _np.empty((len(pixels), 4), _np.uint8)
+        colors[:, 0] = pixels >> 16
+        colors[:, 1] = pixels >> 8
+        colors[:, 2] = pixels
+        colors[:, 3] = pixels >> 24
+        if isinstance(xs, _np.ndarray) or isinstance(ys, _np.ndarray):
+            return colors
+        return [tuple(c) for c in colors.tolist()]
         
-    def getPixelColorStr(self, *args):
+    def getPixelColorStr(self, *args, **kwargs):
         '''
         Returns the X11 color string of a pixel with given user coordinates.
         No params: Returns color at current graph cursor position.
+        With nearest = True the name of the nearest X11 color is returned
+        if there is no exact match (e.g. for antialiased pixels).
         '''
         r, g, b, a = self.getPixelColor(*args)
-        for name, rgb in x11ColorDict.items():
-            if name[-1] in [str(i) for i in range(10)]:  # skip names with ending number
-                continue
-            if " " in name:  # skip names with space
-                continue
-            if "grey" in name:  # skip British gray
-                continue
-            if rgb == [r, g, b]:
-                return name
-        raise ValueError("X11 color", [r, g, b], "not found")
+        return _x11ColorName(r, g, b, kwargs.get("nearest", False))
 
     def _toColor(self, color):
         if type(color) == str:
@@ -1960,6 +3297,7 @@ class GPanel(QtGui.QWidget):
         else:
            return color
 
+    @_command
     def fill(self, x, y, *args):
         '''
         Fills the closed unicolored region with the inner point (x, y) with
@@ -1972,35 +3310,98 @@ class GPanel(QtGui.QWidget):
         '''
         xPix = self.toPixelX(x)
         yPix = self.toPixelY(y)
+        img = self._getImage()
+        if not (0 <= xPix < img.width() and 0 <= yPix < img.height()):
+            return
 
         if len(args) == 2:
-            color = self._toColor(args[0])
-            replacementColor = self._toColor(args[1])
+            color = _packRGB(self._toColor(args[0]))
+            replacementColor = _packRGB(self._toColor(args[1]))
         elif len(args) == 1:
-            im = self._pixmap.toImage()
-            col= QColor(im.pixel(xPix, yPix))
-            color = [col.red(), col.green(), col.blue()]
-            replacementColor = self._toColor(args[0])
+            color = img.pixel(xPix, yPix)
+            if not img.hasAlphaChannel():
+                color |= 0xFF000000
+            replacementColor = _packRGB(self._toColor(args[0]))
         else:
             raise ValueError("Illegal number of parameters.")
 
-        img = GPanel.floodFill(self._pixmap, [self.toPixelX(x), self.toPixelY(y)], color, replacementColor)
-        self._painter.drawImage(0, 0, img)
-        if self._enableRepaint:
-            self.repaint()
+        bounds = _spanFill(_rasterView(img), img.width(), img.height(),
+                           xPix, yPix, color, replacementColor)
+        if bounds == None:
+            return
+        # only the changed bounding rectangle is written back
+        # (a headless buffer was filled in place)
+        x0, y0, x1, y1 = bounds
+        rect = QRect(x0, y0, x1 - x0 + 1, y1 - y0 + 1)
+        if img is not self._pixmap:
+            self._painter.drawImage(rect.topLeft(), img, rect)
+        self._drawn(rect)
+        self._image = img  # still in sync with the offscreen buffer
+
+    def _bounds(self, xs, ys):
+        # Returns the bounding rectangle of the given pixel coordinates
+        # enlarged by the pen size
+        d = int(math.ceil(self._penSize / 2.0)) + 1
+        return QRect(QPoint(min(xs) - d, min(ys) - d), QPoint(max(xs) + d, max(ys) + d))
+
+    def _polygonBounds(self, polygon):
+        rect = polygon.boundingRect()
+        return self._bounds([int(rect.left()), int(math.ceil(rect.right()))],
+                            [int(rect.top()), int(math.ceil(rect.bottom()))])
+
+    def _getImage(self):
+        # Returns a QImage (format RGB32, ARGB32 for added layers) of the offscreen
+        # buffer of the current layer that is shared by all readers until the next
+        # drawing operation
+        self._sync()
+        if isinstance(self._pixmap, QImage):
+            return self._pixmap
+        if self._image == None:
+            self._image = self._pixmap.toImage().convertToFormat(QImage.Format_RGB32)
+        return self._image
 
     def getPainter(self):
         '''
         Returns the QPainter reference used to draw into the offscreen buffer.
-        '''
+        (The cached image used by getPixelColor() is dropped, because
+        the painter is used to draw outside of the GPanel methods,
+        the next repaint() renders the whole graphics window.)
+        In threaded mode the painter belongs to the render thread.
+        '''
+        self._sync()
+        self._image = None
+        self._dirty = self._pixmap.rect()
+        self._strokeMode()
+        self._painterState = None  # the caller may change the painter's pen and brush
         return self._painter
 
     def getFullImage(self):
         '''
-        Returns the QImage reference of the whole graphics area.
+        Returns the QImage reference of the whole graphics area
+        (all layers composited).
         '''
-        return self._pixmap.toImage()
+        self._sync()
+        with self._renderLock:
+            if len(self._layers) > 1:
+                img = QImage(self.winWidth, self.winHeight, QImage.Format_RGB32)
+                self._compose(img, img.rect())
+                return img
+            base = self._layers[_BASE_LAYER][0]
+            if isinstance(base, QImage):  # headless or threaded
+                return base.copy()
+            return base.toImage()
 
+    def saveImage(self, filename, pic_format = None):
+        '''
+        Saves the whole graphics area in a picture file. For pic_format = None,
+        the picture format is guessed from the file suffix.
+        @param filename: the file path of the picture file
+        @param pic_format: format of picture, e.g. "PNG" (default: None)
+        @return: True, if operation is successful; otherwise false
+        '''
+        return self.getFullImage().save(filename, pic_format)
+
+    @_command
     def drawGrid(self, *args):
         '''
         Draws a coordinate system with annotated axes.
@@ -2053,7 +3454,6 @@ class GPanel(QtGui.QWidget):
         self.pos(xPos, yPos)
         if color != None:
             self._penColor = oldColor
-            self._painter.setPen(QPen(self._penColor, self._penSize))
 
     def addMousePressListener(self, onMousePressed):
         '''
@@ -2117,14 +3517,20 @@ class GPanel(QtGui.QWidget):
     def getScreenWidth(self):
         '''
         Returns the screen width in pixels.
+        (The graphics width in headless mode.)
         '''
+        if self._headless:
+            return self.winWidth
         screen_resolution = self._app.desktop().screenGeometry()
         return screen_resolution.width()
 
     def getScreenHeight(self):
         '''
         Returns the screen height in pixels.
+        (The graphics height in headless mode.)
         '''
+        if self._headless:
+            return self.winHeight
         screen_resolution = self._app.desktop().screenGeometry()
         return screen_resolution.height()
 
@@ -2133,6 +3539,8 @@ class GPanel(QtGui.QWidget):
         '''
         Sets the screen position to the center of the screen.
         '''
+        if self._headless:
+            return
         frameGm = self.frameGeometry()
         centerPoint = QtGui.QDesktopWidget().availableGeometry().center()
         frameGm.moveCenter(centerPoint)
@@ -2144,8 +3552,11 @@ class GPanel(QtGui.QWidget):
         @param ulx: the upper left corner's x-coordinate
         @param ulx: the upper left  corner's y-coordinate
         '''
+        if self._headless:
+            return
         super(GPanel, self).move(ulx, uly)
 
+    @_command
     def saveGraphics(self):
         '''
         Saves the current graphics into a image buffer. Use restoreGraphics()
@@ -2153,6 +3564,7 @@ class GPanel(QtGui.QWidget):
         '''
         self._savePixmap = self._pixmap.copy(QRect())
 
+    @_command
     def restoreGraphics(self):
         '''
         Restores the saved graphics from the image buffer. Use saveGraphics()
@@ -2160,11 +3572,14 @@ class GPanel(QtGui.QWidget):
         '''
         if self._savePixmap == None:
             raise Exception("Store graphics buffer is empty.")
-        img = self._savePixmap.toImage()
+        if isinstance(self._savePixmap, QImage):
+            img = self._savePixmap
+        else:
+            img = self._savePixmap.toImage()
         self._painter.drawImage(0, 0, img)
-        if self._enableRepaint:
-            self.repaint()
+        self._drawn(self._pixmap.rect())
 
+    @_command
     def setXORMode(self, *args):
         '''
         Performs pixel color XOR operation with the existing background pixel.
@@ -2174,6 +3589,7 @@ class GPanel(QtGui.QWidget):
         self._painter.setCompositionMode(QPainter.RasterOp_SourceXorDestination)
 
 
+    @_command
     def setPaintMode(self):
         '''
         Resets the drawing mode to standard (overwriting).
@@ -2184,12 +3600,16 @@ class GPanel(QtGui.QWidget):
         '''
         Sets the screen position (pixel coordinates of upper left corner).
         '''
+        if self._headless:
+            return
         super(GPanel, self).move(ulx, uly)
         
     def windowCenter(self):
         '''
         Sets the window to the center of the screen.
         '''
+        if self._headless:
+            return
         xc, yc = GPanel.getScreenCenter()
         self.windowPosition(xc - self.winWidth // 2, yc - self.winHeight // 2) 
         
@@ -2307,34 +3727,9 @@ class GPanel(QtGui.QWidget):
         @param newColor the new color of the region (RGB list/tuple)
         @return a new qImage with the transformed region
         '''
-        image = pm.toImage()
-        oldColor = QColor(oldColor[0], oldColor[1], oldColor[2]).rgb()
-        newColor = QColor(newColor[0], newColor[1], newColor[2]).rgb()
-        q = [pt]
-
-        # Perform filling operation
-        while len(q) > 0:
-            n = q.pop(0)
-            if QColor(image.pixel(n[0], n[1])).rgb() != oldColor:
-                continue
-
-            w = n
-            e = [n[0] + 1, n[1]]
-            while w[0] > 0 and QColor(image.pixel(w[0], w[1])).rgb() == oldColor:
-                image.setPixel(w[0], w[1], newColor)
-                if w[1] > 0 and QColor(image.pixel(w[0], w[1] - 1)).rgb() == oldColor:
-                    q.append([w[0], w[1] - 1])
-                if w[1] < image.height() - 1 and QColor(image.pixel(w[0], w[1] + 1)).rgb() == oldColor:
-                    q.append([w[0], w[1] + 1])
-                w[0] -= 1
-
-            while e[0] < image.width() - 1 and QColor(image.pixel(e[0], e[1])).rgb() == oldColor:
-                image.setPixel(e[0], e[1], newColor)
-                if e[1] > 0 and QColor(image.pixel(e[0], e[1] - 1)).rgb() == oldColor:
-                    q.append([e[0], e[1] - 1])
-                if e[1] < image.height() - 1 and QColor(image.pixel(e[0], e[1] + 1)).rgb() == oldColor:
-                    q.append([e[0], e[1] + 1])
-                e[0] += 1
+        image = pm.toImage().convertToFormat(QImage.Format_RGB32)
+        _spanFill(_rasterView(image), image.width(), image.height(),
+                  pt[0], pt[1], _packRGB(oldColor), _packRGB(newColor))
         return image
 
     @staticmethod
@@ -1,56 +1,121 @@
 from gpanel import *
+from GameState import EMPTY, SNAKE, APPLE, ACTIONS
+from GameLoop import clock
+from collections import deque
 
 class tiger:
 
     def __init__(self, GRIDSIZE):
         self.GRIDSIZE = GRIDSIZE
+        self.cells = bytearray(GRIDSIZE * GRIDSIZE)
+
+        # Key presses as (direction, time), appended by the key handler and taken
+        # once per tick. deque.append/popleft need no lock, the oldest are dropped when full
+        self.inputs = deque(maxlen=self.INPUT_QUEUE_SIZE)
+        self.inputTime = None
+        self.histogram = None
+        self.motion = None
         makeGPanel(0, self.GRIDSIZE, 0, self.GRIDSIZE, keyPressed=self.onKeyPressed)
         # makeGPanel(-1, self.GRIDSIZE + 1, -1, self.GRIDSIZE + 1, keyPressed=self.onKeyPressed)
-        #self.drawBoard()
+        self.drawBackground()
         pass
 
-    def updateGrid(self, grid):
-        self.grid = grid
-        self.drawBoard()
+    # Applies the (x, y, state) changes of one tick and draws only the changed tiles
+    def applyDelta(self, delta):
+        with frame():
+            for x, y, state in delta:
+                self.cells[y * self.GRIDSIZE + x] = state
+                self.drawTile(x, y, state)
+
+        # Time from the key press to the drawn move
+        if self.inputTime is not None:
+            if self.histogram is not None:
+                self.histogram.record("input", clock() - self.inputTime)
+            self.inputTime = None
 
 
     GRIDSIZE = 10
-    grid = [[None, None, None, None, None, None, None, None, None, None],
-            [None, None, None, None, None, None, None, None, None, None],
-            [None, None, None, None, None, None, None, None, None, None],
-            [None, None, None, None, None, None, None, None, None, None],
-            [None, None, None, None, None, None, None, None, None, None],
-            [None, None, None, None, None, None, None, None, None, None],
-            [None, None, None, None, None, None, None, None, None, None],
-            [None, None, None, None, None, None, None, None, None, None],
-            [None, None, None, None, None, None, None, None, None, None],
-            [None, None, None, None, None, None, None, None, None, None]]
     direction = "right"
-
+    INPUT_QUEUE_SIZE = 8
+
+    # Color of each tile state
+    COLORS = {EMPTY: "white", SNAKE: "blue", APPLE: "red"}
+
+    # Draws the static grid lines once into the base layer, the tiles are
+    # drawn into their own layer above, so the grid is never drawn again
+    def drawBackground(self):
+        with frame():
+            clear()
+            setColor("black")
+            for k in range(self.GRIDSIZE):
+                for i in range(self.GRIDSIZE):
+                    rectangle(i, k, i + 1, k + 1)
+        addLayer("tiles")
+        setLayer("tiles")
+
+        # Tiles are filled one pixel inside of the grid lines
+        self.insetX = toUserWidth(1)
+        self.insetY = toUserHeight(1)
+
+
+    # Fills the inside of one tile with the color of its state
+    def drawTile(self, x, y, state):
+        setColor(self.COLORS[state])
+        fillRectangle(x + self.insetX, y + 1 - self.insetY, x + 1 - self.insetX, y + self.insetY)
+
+
+    # Fills the part (fraction 0..1) of the tile at the side of the neighbour
+    # tile with the snake color, the rest with the color of the given state
+    def drawPartialTile(self, tile, neighbour, fraction, state):
+        x, y = tile
+        self.drawTile(x, y, state)
+        if fraction <= 0:
+            return
+        x1, y1 = x + self.insetX, y + self.insetY
+        x2, y2 = x + 1 - self.insetX, y + 1 - self.insetY
+        if neighbour[0] > x:
+            x1 = x2 - fraction * (x2 - x1)
+        elif neighbour[0] < x:
+            x2 = x1 + fraction * (x2 - x1)
+        elif neighbour[1] > y:
+            y1 = y2 - fraction * (y2 - y1)
+        else:
+            y2 = y1 + fraction * (y2 - y1)
+        setColor(self.COLORS[SNAKE])
+        fillRectangle(x1, y2, x2, y1)
+
+
+    # Draws the move of the last tick, alpha of the way done (render interpolation).
+    # motion is (head, neck, old tail, tail): the head grows out of the neck, the
+    # tile left by the old tail (None if the snake grew) shrinks towards the tail.
+    # The tiles of the move before are drawn whole again
+    def drawMotion(self, motion, alpha):
+        with frame():
+            if motion != self.motion:
+                if self.motion is not None:
+                    for tile in (self.motion[0], self.motion[2]):
+                        if tile is not None:
+                            self.drawTile(tile[0], tile[1], self.cells[tile[1] * self.GRIDSIZE + tile[0]])
+                self.motion = motion
+            head, neck, oldTail, tail = motion
+            self.drawPartialTile(head, neck, alpha, EMPTY)
+            if oldTail is not None:
+                self.drawPartialTile(oldTail, tail, 1 - alpha, self.cells[oldTail[1] * self.GRIDSIZE + oldTail[0]])
+
+
+    # Draws the whole board on top of the grid
     def drawBoard(self):
         #print("draw", self.grid)
 
-        # Draw Grid
-        for k in range(self.GRIDSIZE):
-            for i in range(self.GRIDSIZE):
-                rectangle(i, k, i + 1, k + 1)
-
-
-        for y in range(self.GRIDSIZE):
-            for x in range(self.GRIDSIZE):
-                # Draw when empty
-                if self.grid[y][x] == None:
-                    fill(x + 0.1, y + 0.1, "blue", "white")
-                    fill(x + 0.1, y + 0.1, "red", "white")
-                    continue
+        # Draw the whole board as one frame, so the window is only rendered once
+        with frame():
+            clearLayer("tiles")
 
-                # Draw when "Apple"
-                if self.grid[y][x] == "Apple":
-                    fill(x + 0.1, y + 0.1, "white", "red")
-                    continue
-
-                # Draw Snake
-                fill(x + 0.1, y + 0.1, "white", "blue")
+            for y in range(self.GRIDSIZE):
+                for x in range(self.GRIDSIZE):
+                    state = self.cells[y * self.GRIDSIZE + x]
+                    if state != EMPTY:
+                        self.drawTile(x, y, state)
 
 
     # def drawBoard(self):
@@ -71,22 +136,36 @@ class tiger:
     #             fill(self.koordTransformation_X(u) - 0.1, self.koordTransformation_Y(i) - 0.1, "white", "blue")
 
 
-    # Changes the direction with a press of the arrow keys
+    # Queues the direction of the pressed arrow key
     def onKeyPressed(self, key_code):
         if (key_code == 40):
-            self.direction = "down"
+            self.inputs.append(("down", clock()))
             print("Keychanged ", key_code, " -- down")
         if (key_code == 39):
-            self.direction = "right"
+            self.inputs.append(("right", clock()))
             print("Keychanged ", key_code, " -- right")
         if (key_code == 38):
-            self.direction = "up"
+            self.inputs.append(("up", clock()))
             print("Keychanged ", key_code, " -- up")
         if (key_code == 37):
-            self.direction = "left"
+            self.inputs.append(("left", clock()))
             print("Keychanged ", key_code, " -- left")
 
 
+    # Takes the next turn from the queue, call once per tick. Presses of the
+    # current direction or the opposite one (the snake would bite itself)
+    # are dropped, every other press is one turn, so quick presses are not lost.
+    # Returns the direction the snake should move
+    def nextDir(self):
+        reverse = ACTIONS[(ACTIONS.index(self.direction) + 2) % 4]
+        while self.inputs:
+            direction, time = self.inputs.popleft()
+            if direction != self.direction and direction != reverse:
+                self.direction = direction
+                self.inputTime = time
+                break
+        return self.direction
+
 
     # Returns the current Direction the snake should move
     def getDir(self):